@@ -0,0 +1,239 @@
+"""CSC111 Project 2: Batch Queries
+
+This file runs analysis queries without the interactive menus. Queries are read from a JSON Lines file, one
+query per line, and their results are written as JSON. Every query names a month, a hierarchy (the number of a
+preset analysis of the main menu or a list of columns), an operation and the arguments of the operation, e.g.
+
+    {"month": "march", "hierarchy": 1, "op": "top_rankings", "args": {"beginning": 1, "end": 10}}
+    {"month": "march", "hierarchy": ["MCI_CATEGORY", "OCC_HOUR"], "op": "search", "args": {"value": "Assault"}}
+
+The operations are the analysis queries of Tree: top_rankings, top_specific, crime_time_shift, specific_ranked,
+search, most_common and least_common. A query is answered from the full tree, or from the cropped tree of high
+frequency crimes if it has "tree": "cropped". Queries sharing a month and hierarchy share one build of their trees.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Optional
+import argparse
+import csv
+import json
+import sys
+from crime_tree import Tree
+from compact_tree import CompactTree
+from render_data import ANALYSIS_OPTIONS, CSV_PATH, CUBE_COLUMNS, MONTHS, build_crime_tree
+
+
+def run_batch(queries: list[dict[str, Any]], csv_path: str = CSV_PATH) -> list[dict[str, Any]]:
+    """Return the results of queries, in the same order.
+
+    Each result holds the query and either its "result" or, if the query is invalid or its trees could not be
+    built, an "error" message. The trees of each month and hierarchy are built once, however many queries use
+    them.
+
+    >>> query = {'month': 'march', 'hierarchy': 1, 'op': 'most_common'}
+    >>> run_batch([query, {'month': 'smarch'}], 'missing.csv')[0]['error']
+    "could not build the trees of march: [Errno 2] No such file or directory: 'missing.csv'"
+    """
+    results: list[Optional[dict[str, Any]]] = [None] * len(queries)
+    groups: dict[tuple[str, tuple[str, ...]], list[int]] = {}
+    for i, query in enumerate(queries):
+        try:
+            month, columns = query_tree(query)
+        except ValueError as error:
+            results[i] = {'query': query, 'error': str(error)}
+        else:
+            groups.setdefault((month, tuple(columns)), []).append(i)
+
+    for (month, columns), positions in groups.items():
+        try:
+            full_tree, cropped_tree = build_crime_tree(month, list(columns), csv_path)
+        except (OSError, ValueError, LookupError, csv.Error) as error:
+            # e.g. a missing csv file or a malformed row: every query of these trees fails, and the others still run
+            for i in positions:
+                results[i] = {'query': queries[i], 'error': f'could not build the trees of {month}: {error}'}
+            continue
+        for i in positions:
+            query = queries[i]
+            tree = cropped_tree if query.get('tree') == 'cropped' else full_tree
+            try:
+                results[i] = {'query': query, 'result': run_query(tree, query)}
+            except ValueError as error:
+                results[i] = {'query': query, 'error': str(error)}
+    return results
+
+
+def query_tree(query: dict[str, Any]) -> tuple[str, list[str]]:
+    """Return the lowercase month and the columns of the trees that answer query.
+
+    Raise a ValueError if the query does not name a valid month and hierarchy.
+
+    >>> query_tree({'month': 'March', 'hierarchy': 3})
+    ('march', ['MCI_CATEGORY', 'NEIGHBOURHOOD_158', 'PREMISES_TYPE'])
+    >>> query_tree({'month': 'march', 'hierarchy': ['OCC_HOUR', 'OFFENCE']})
+    ('march', ['OCC_HOUR', 'OFFENCE'])
+    >>> query_tree({'month': 'march', 'hierarchy': True})
+    Traceback (most recent call last):
+    ...
+    ValueError: invalid hierarchy: True
+    """
+    month = str(query.get('month', '')).lower()
+    if month not in MONTHS:
+        raise ValueError(f'unknown month: {query.get("month")!r}')
+
+    hierarchy = query.get('hierarchy')
+    if isinstance(hierarchy, int) and not isinstance(hierarchy, bool) and hierarchy in ANALYSIS_OPTIONS:
+        return month, ANALYSIS_OPTIONS[hierarchy]
+    if isinstance(hierarchy, list) and hierarchy and all(column in CUBE_COLUMNS for column in hierarchy) \
+            and len(set(hierarchy)) == len(hierarchy):
+        return month, hierarchy
+    raise ValueError(f'invalid hierarchy: {hierarchy!r}')
+
+
+def run_query(tree: Tree | CompactTree, query: dict[str, Any]) -> Any:
+    """Return the JSON-serializable result of the operation of query on tree, which may also be in compact form.
+
+    Raise a ValueError if the operation is unknown or its arguments are invalid.
+
+    >>> tree = Tree("Root", 0, [])
+    >>> tree.insert_data(["Theft", "Day"], [0, 1])
+    >>> tree.insert_data(["Theft", "Night"], [0, 1])
+    >>> tree.insert_data(["Assault", "Day"], [0, 1])
+    >>> run_query(tree, {'op': 'top_rankings', 'args': {'beginning': 1, 'end': 2}})
+    [{'rank': 1, 'value': 'Theft', 'frequency': 2}, {'rank': 2, 'value': 'Assault', 'frequency': 1}]
+    >>> run_query(tree, {'op': 'specific_ranked', 'args': {'specific': 'Assault'}})
+    {'name': 'Assault', 'rank': 2, 'frequency': 1}
+    >>> run_query(tree, {'op': 'search', 'args': {'value': 'Night'}})
+    {'frequency': 1, 'path': ['Root', 'Theft', 'Night']}
+    >>> run_query(tree, {'op': 'top_rankings', 'args': {'beginning': 1, 'end': 3}})
+    Traceback (most recent call last):
+    ...
+    ValueError: end must be at most the number of subtrees (2)
+    >>> run_query(tree, {'op': 'search', 'args': {'value': 5}})
+    Traceback (most recent call last):
+    ...
+    ValueError: invalid arguments for search: value must be a string
+    """
+    operation = OPERATIONS.get(query.get('op'))
+    if operation is None:
+        raise ValueError(f'unknown operation: {query.get("op")!r}')
+    args = query.get('args', {})
+    if not isinstance(args, dict):
+        raise ValueError('args must be an object')
+    for name, value in args.items():
+        expected = ARGUMENT_TYPES.get(name)
+        # bool is a subclass of int, but true and false are not valid ranks
+        if expected is not None and (not isinstance(value, expected) or isinstance(value, bool)):
+            raise ValueError(f'invalid arguments for {query["op"]}: {name} must be {_TYPE_NAMES[expected]}')
+    try:
+        return operation(tree, **args)
+    except (TypeError, AttributeError) as error:
+        raise ValueError(f'invalid arguments for {query["op"]}: {error}') from error
+
+
+def _rankings(rankings: dict[int, tuple[str, int]]) -> list[dict[str, Any]]:
+    """Return rankings as a list of JSON objects, in order of rank."""
+    return [{'rank': rank, 'value': value, 'frequency': freq} for rank, (value, freq) in rankings.items()]
+
+
+def _top_rankings(tree: Tree | CompactTree, beginning: int = 1, end: int = 5) -> list[dict[str, Any]]:
+    """Return the subtrees of tree ranked beginning to end by frequency."""
+    if not 1 <= beginning <= end:
+        raise ValueError('ranks must satisfy 1 <= beginning <= end')
+    num_subtrees = len(tree.subtrees) if isinstance(tree, Tree) else len(tree.children())
+    if end > num_subtrees:
+        raise ValueError(f'end must be at most the number of subtrees ({num_subtrees})')
+    return _rankings(tree.top_rankings(beginning, end))
+
+
+def _top_specific(tree: Tree | CompactTree, specific: str) -> dict[str, Any]:
+    """Return the subtrees of the subtree of tree matching specific ranked by frequency."""
+    name, rankings = tree.top_specific(specific)
+    return {'name': name, 'rankings': _rankings(rankings)}
+
+
+def _crime_time_shift(tree: Tree | CompactTree, crime_category: str) -> dict[str, Any]:
+    """Return the day and night frequency of crime_category in tree."""
+    name, day_freq, night_freq = tree.crime_time_shift(crime_category)
+    return {'name': name, 'day': day_freq, 'night': night_freq}
+
+
+def _specific_ranked(tree: Tree | CompactTree, specific: str) -> dict[str, Any]:
+    """Return the rank and frequency of the subtree of tree matching specific."""
+    name, rank, freq = tree.specific_ranked(specific)
+    return {'name': name, 'rank': rank, 'frequency': freq}
+
+
+def _search(tree: Tree | CompactTree, value: str) -> Optional[dict[str, Any]]:
+    """Return the frequency of and the path to the first node of tree matching value, or None if there is none."""
+    result = tree.search_value_in_tree(value)
+    return None if result is None else {'frequency': result[0], 'path': result[1]}
+
+
+def _most_common(tree: Tree | CompactTree) -> dict[str, Any]:
+    """Return the frequency and path of the most common crime in tree."""
+    freq, path = tree.find_most_common_crime()
+    return {'frequency': freq, 'path': path}
+
+
+def _least_common(tree: Tree | CompactTree) -> dict[str, Any]:
+    """Return the frequency and path of the least common crime in tree."""
+    freq, path = tree.find_least_common_crime()
+    return {'frequency': freq, 'path': path}
+
+
+# The JSON type of each argument of the operations
+ARGUMENT_TYPES: dict[str, type] = {
+    'beginning': int,
+    'end': int,
+    'specific': str,
+    'crime_category': str,
+    'value': str
+}
+_TYPE_NAMES = {int: 'an integer', str: 'a string'}
+
+# Maps the name of each operation to the function answering it, which takes the tree and the query's arguments
+OPERATIONS: dict[str, Callable[..., Any]] = {
+    'top_rankings': _top_rankings,
+    'top_specific': _top_specific,
+    'crime_time_shift': _crime_time_shift,
+    'specific_ranked': _specific_ranked,
+    'search': _search,
+    'most_common': _most_common,
+    'least_common': _least_common
+}
+
+
+def load_queries(path: str) -> list[dict[str, Any]]:
+    """Return the queries of the JSON Lines file at path, skipping blank lines.
+
+    Raise a ValueError naming the line of the first line that is not a JSON object.
+    """
+    queries = []
+    with open(path, 'r', encoding='utf-8') as query_file:
+        for number, line in enumerate(query_file, 1):
+            if not line.strip():
+                continue
+            try:
+                query = json.loads(line)
+            except json.JSONDecodeError as error:
+                raise ValueError(f'{path}:{number}: {error}') from error
+            if not isinstance(query, dict):
+                raise ValueError(f'{path}:{number}: a query must be a JSON object')
+            queries.append(query)
+    return queries
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a file of crime tree queries and write the results as JSON.')
+    parser.add_argument('queries', help='JSON Lines file with one query per line')
+    parser.add_argument('--output', help='file to write the results to (standard output if omitted)')
+    parser.add_argument('--csv', default=CSV_PATH, help='crime dataset to build the trees from')
+    arguments = parser.parse_args()
+
+    batch_results = run_batch(load_queries(arguments.queries), arguments.csv)
+    if arguments.output is None:
+        json.dump(batch_results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(arguments.output, 'w', encoding='utf-8') as output_file:
+            json.dump(batch_results, output_file, indent=2)
+    sys.exit(1 if any('error' in result for result in batch_results) else 0)
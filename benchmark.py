@@ -0,0 +1,386 @@
+"""CSC111 Project 2: Benchmarks
+
+This file generates synthetic crime datasets with the same title row and similar category cardinalities as
+2024_major_crime_indicators.csv, and times building, cropping, analysing and drawing crime trees on them.
+The wall time and peak traced memory of every phase are recorded as JSON, so that the results of two commits
+can be compared. The approximate rankings of sketches.py are also timed, and their accuracy is measured against
+the exact trees.
+
+Usage:
+    python benchmark.py --rows 100000 1000000 10000000 --output benchmark_results.json
+    python benchmark.py --compare old_results.json new_results.json
+"""
+from __future__ import annotations
+from typing import Any, Callable, Optional
+import argparse
+import calendar
+import csv
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import graphviz
+from crime_tree import Tree
+from normalize import DEFAULT_RULE, LabelTable, column_rule
+import column_store
+import render_data as rd
+import sketches
+
+TITLES = ['OBJECTID', 'EVENT_UNIQUE_ID', 'REPORT_DATE', 'OCC_DATE', 'REPORT_YEAR', 'REPORT_MONTH', 'REPORT_DAY',
+          'REPORT_DOY', 'REPORT_DOW', 'REPORT_HOUR', 'OCC_YEAR', 'OCC_MONTH', 'OCC_DAY', 'OCC_DOY', 'OCC_DOW',
+          'OCC_HOUR', 'DIVISION', 'LOCATION_TYPE', 'PREMISES_TYPE', 'UCR_CODE', 'UCR_EXT', 'OFFENCE', 'MCI_CATEGORY',
+          'HOOD_158', 'NEIGHBOURHOOD_158', 'HOOD_140', 'NEIGHBOURHOOD_140', 'LONG_WGS84', 'LAT_WGS84']
+DIVISIONS = ['D11', 'D12', 'D13', 'D14', 'D22', 'D23', 'D31', 'D32', 'D33', 'D41', 'D42', 'D43', 'D51', 'D52',
+             'D53', 'D55', 'NSA']
+PREMISES_TYPES = ['Outside', 'Apartment', 'Commercial', 'House', 'Other', 'Transit', 'Educational']
+LOCATION_TYPES = [
+    'Streets, Roads, Highways (Bicycle Path, Private Road)', 'Apartment (Rooming House, Condo)',
+    'Single Home, House (Attach Garage, Cottage, Mobile)', 'Parking Lots (Apt., Commercial Or Non-Commercial)',
+    'Other Commercial / Corporate Places (For Profit, Warehouse, Corp. Bldg',
+    'Bar / Restaurant', 'Convenience Stores', 'Open Areas (Lakes, Parks, Rivers)', 'Homeless Shelter / Mission',
+    'Private Property Structure (Pool, Shed, Detached Garage)', 'Retirement Home', 'Hospital / Institutions',
+    'Schools During Supervised Activity', 'Schools During Un-Supervised Activity',
+    'Bank And Other Financial Institutions',
+    'Gas Station (Self, Full, Attached Convenience)', 'Dealership (Car, Motorcycle, Marine, Trailer, Etc.)',
+    'Ttc Subway Station', 'Ttc Bus', 'Ttc Subway Train', 'Ttc Streetcar', 'Go Station', 'Go Train', 'Go Bus',
+    'Construction Site (Warehouse, Trailer, Shed)', 'Community Group Home', 'Universities / Colleges',
+    'Police / Courts (Parole Board, Probation Office)', 'Jails / Detention Centres', 'Group Homes (Non-Profit)',
+    'Other Non Commercial / Corporate Places (Non-Profit, Gov\'T, Firehall)', 'Other Regional Transit System Vehicle',
+    'Cargo Train, Yard / Station', 'Nursing Home', 'Religious Facilities (Synagogue, Church, Mosque, Etc.)',
+    'Ttc Light Rail Transit Station', 'Ttc Admin Or Support Facility', 'Pharmacy',
+]
+# Offences of each major crime indicator category, most common first
+OFFENCES = {
+    'Assault': ['Assault', 'Assault With Weapon', 'Assault Bodily Harm', 'Assault Peace Officer',
+                'Aggravated Assault', 'Assault - Resist/ Prevent Seiz', 'Assault - Force/Thrt/Impede',
+                'Discharge Firearm With Intent', 'Pointing A Firearm', 'Administering Noxious Thing',
+                'Aggravated Assault Avails Pros', 'Air Gun Or Pistol: Bodily Harm', 'Assault Peace Officer Wpn/Cbh',
+                'Discharge Firearm - Recklessly', 'Use Firearm / Immit Commit Off', 'Unlawfully Causing Bodily Harm'],
+    'Auto Theft': ['Theft Of Motor Vehicle'],
+    'Break and Enter': ['B&E', 'B&E W\'Intent', 'Unlawfully In Dwelling-House', 'Break & Enter-Firearm',
+                        'B&E Out', 'Break & Enter Apartment', 'Break & Enter House', 'Break & Enter Commercial'],
+    'Robbery': ['Robbery - Mugging', 'Robbery With Weapon', 'Robbery - Business', 'Robbery - Swarming',
+                'Robbery - Other', 'Robbery - Purse Snatch', 'Robbery - Home Invasion', 'Robbery - Vehicle Jacking',
+                'Robbery - Financial Institute', 'Robbery - Delivery Person', 'Robbery - Taxi',
+                'Robbery To Steal Firearm'],
+    'Theft Over': ['Theft Over', 'Theft Over - Bicycle', 'Theft Of Motor Vehicle - Over',
+                   'Theft From Mail / Bag / Key', 'Theft Over - Shoplifting', 'Theft Over - Distraction'],
+}
+MCI_WEIGHTS = {'Assault': 50, 'Auto Theft': 17, 'Break and Enter': 17, 'Robbery': 6, 'Theft Over': 5}
+NUM_NEIGHBOURHOODS = 158
+DAYS_OF_WEEK = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# The hierarchies of main.py's analysis menu, plus a deep custom hierarchy
+HIERARCHIES = {
+    'location': ['NEIGHBOURHOOD_158', 'MCI_CATEGORY', 'PREMISES_TYPE'],
+    'time': ['OCC_HOUR', 'MCI_CATEGORY', 'NEIGHBOURHOOD_158'],
+    'crime': ['MCI_CATEGORY', 'NEIGHBOURHOOD_158', 'PREMISES_TYPE'],
+    'premise': ['PREMISES_TYPE', 'MCI_CATEGORY', 'NEIGHBOURHOOD_158'],
+    'custom6': ['OCC_DAY', 'OCC_HOUR', 'OFFENCE', 'NEIGHBOURHOOD_158', 'PREMISES_TYPE', 'OCC_DOW'],
+}
+BENCHMARK_MONTH = 'March'
+DEFAULT_ROWS = [100000]
+
+
+def generate_dataset(path: str, rows: int, seed: int = 111) -> None:
+    """Write a synthetic crime dataset with the given number of rows to path.
+
+    Categories are drawn from skewed distributions over sets of the same sizes as the real dataset, and
+    the occurrence dates, days of the week and coordinates of every row are consistent with each other.
+
+    Preconditions:
+        - rows >= 0
+    """
+    rng = random.Random(seed)
+    categories = list(MCI_WEIGHTS)
+    mci_weights = [MCI_WEIGHTS[category] for category in categories]
+    neighbourhoods = [(number, f'Neighbourhood {number:03d} ({number})') for number in range(1, NUM_NEIGHBOURHOODS + 1)]
+    neighbourhoods.append((0, 'NSA'))
+    centres = [(43.58 + rng.random() * 0.27, -79.64 + rng.random() * 0.52) for _ in neighbourhoods]
+    # Occurrence dates, mostly in 2024 with a few reported late
+    dates = [datetime.date(year, month, day) for year in (2022, 2023, 2024) for month in range(1, 13)
+             for day in range(1, calendar.monthrange(year, month)[1] + 1)]
+    date_weights = [{2022: 1, 2023: 4, 2024: 45}[date.year] for date in dates]
+
+    with open(path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(TITLES)
+        batch_size = 100000
+        for batch_start in range(0, rows, batch_size):
+            size = min(batch_size, rows - batch_start)
+            batch_dates = rng.choices(dates, weights=date_weights, k=size)
+            batch_categories = rng.choices(categories, weights=mci_weights, k=size)
+            batch_hoods = rng.choices(range(len(neighbourhoods)), weights=_skewed(len(neighbourhoods)), k=size)
+            batch_premises = rng.choices(PREMISES_TYPES, weights=_skewed(len(PREMISES_TYPES)), k=size)
+            batch_locations = rng.choices(LOCATION_TYPES, weights=_skewed(len(LOCATION_TYPES)), k=size)
+            batch_divisions = rng.choices(DIVISIONS, weights=_skewed(len(DIVISIONS)), k=size)
+            batch_hours = rng.choices(range(24), weights=[2 + abs(hour - 4) for hour in range(24)], k=size)
+            for i in range(size):
+                row_id = batch_start + i + 1
+                date = batch_dates[i]
+                category = batch_categories[i]
+                offences = OFFENCES[category]
+                offence = offences[min(int(rng.expovariate(0.7)), len(offences) - 1)]
+                number, hood = neighbourhoods[batch_hoods[i]]
+                latitude, longitude = centres[batch_hoods[i]]
+                occurred = date.isoformat()
+                writer.writerow([
+                    row_id, f'GO-{date.year}{row_id:08d}', occurred, occurred, date.year, date.strftime('%B'),
+                    date.day, date.timetuple().tm_yday, DAYS_OF_WEEK[date.weekday()], batch_hours[i], date.year,
+                    date.strftime('%B'), date.day, date.timetuple().tm_yday, DAYS_OF_WEEK[date.weekday()],
+                    batch_hours[i], batch_divisions[i], batch_locations[i], batch_premises[i], 1430, 100, offence,
+                    category, number or 'NSA', hood, number or 'NSA', hood,
+                    round(longitude + rng.gauss(0, 0.01), 6), round(latitude + rng.gauss(0, 0.01), 6)
+                ])
+
+
+def _skewed(n: int) -> list[float]:
+    """Return Zipf-like weights for n categories, the first being the most common."""
+    return [1 / (i + 1) ** 0.8 for i in range(n)]
+
+
+def run_benchmarks(row_counts: list[int], repeat: int = 3, memory: bool = True, seed: int = 111,
+                   data_dir: Optional[str] = None) -> dict[str, Any]:
+    """Return the benchmark results of a synthetic dataset of each size in row_counts.
+
+    Every phase is run repeat times and its best and mean wall times are recorded; if memory is True,
+    it is run once more under tracemalloc to record its peak traced memory. Generated datasets are kept
+    in data_dir and reused if it is given.
+
+    Preconditions:
+        - repeat >= 1
+    """
+    results = []
+    original_dir = os.getcwd()
+    if data_dir is not None:
+        data_dir = os.path.abspath(data_dir)
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Work in a temporary directory so the caches on disk start empty and do not touch the real ones
+        os.chdir(work_dir)
+        try:
+            for rows in row_counts:
+                csv_path = os.path.join(data_dir or work_dir, f'synthetic_{rows}_{seed}.csv')
+                if not os.path.exists(csv_path):
+                    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+                    generate_dataset(csv_path, rows, seed)
+                for name, measurement in _benchmark_dataset(csv_path, repeat, memory):
+                    results.append({'rows': rows, 'name': name, **measurement})
+                    print(f'{rows:>10} {name:<45} {measurement["seconds"]:10.4f}s'
+                          + (f' {measurement["peak_bytes"] / 2 ** 20:10.1f} MiB' if memory else '')
+                          + (f'  top-k recall {measurement["top_recall"]:.2f}, overestimate '
+                             f'{measurement["max_overestimate"]} (bound {measurement["error_bound"]})'
+                             if 'top_recall' in measurement else ''))
+        finally:
+            rd.clear_caches()
+            os.chdir(original_dir)
+
+    return {'commit': _current_commit(), 'python': platform.python_version(), 'platform': platform.platform(),
+            'created': datetime.datetime.now().isoformat(timespec='seconds'), 'repeat': repeat, 'seed': seed,
+            'results': results}
+
+
+def _benchmark_dataset(csv_path: str, repeat: int, memory: bool) -> list[tuple[str, dict[str, float]]]:
+    """Return the (phase name, measurement) of every phase benchmarked on the dataset at csv_path."""
+    measurements = []
+
+    def measure(name: str, run: Callable[[Any], Any], setup: Callable[[], Any] = lambda: None) -> None:
+        """Measure one phase and record it under name."""
+        measurements.append((name, _measure(setup, run, repeat, memory)))
+
+    def cold_store() -> None:
+        """Forget every cache, in memory and on disk."""
+        rd.clear_caches()
+        shutil.rmtree(column_store.CACHE_DIR, ignore_errors=True)
+
+    # Ingest: parse the csv file into the column store, then reload the store from its memory map
+    measure('ingest.column_store_from_csv', lambda _: column_store.load_store(csv_path), cold_store)
+    measure('ingest.column_store_from_cache', lambda _: column_store.load_store(csv_path), rd.clear_caches)
+    store = column_store.load_store(csv_path)
+    measure('ingest.build_cubes', lambda _: rd.build_cubes(store))
+    cube = rd.build_cubes(store)[BENCHMARK_MONTH.lower()]
+
+    for hierarchy, columns in HIERARCHIES.items():
+        prefix = f'{hierarchy}.'
+        measure(prefix + 'build_crime_tree_cold', lambda _: rd.build_crime_tree(BENCHMARK_MONTH, columns, csv_path),
+                cold_store)
+        measure(prefix + 'build_crime_tree_snapshot', lambda _: rd.build_crime_tree(BENCHMARK_MONTH, columns, csv_path),
+                rd.clear_caches)
+        # Clearing the caches closed the store loaded before, so load it again
+        store = column_store.load_store(csv_path)
+        measure(prefix + 'cube_tree', lambda _: cube.tree(columns))
+        measure(prefix + 'build_month_tree', lambda _: rd.build_month_tree(store, BENCHMARK_MONTH, columns))
+        rows = _month_rows(store, BENCHMARK_MONTH, columns)
+        measure(prefix + 'insert_data', lambda _: _insert_rows(rows, len(columns)))
+
+        full_tree = cube.tree(columns)
+        measure(prefix + 'crop_tree', lambda _: _crop(full_tree, len(columns)))
+        cropped_tree = _crop(full_tree, len(columns))
+        measure(prefix + 'graph_build_cropped', lambda _: cropped_tree._add_nodes(graphviz.Digraph()))
+        measure(prefix + 'graph_build_full_lod',
+                lambda _: full_tree.level_of_detail(500)._add_nodes(graphviz.Digraph()))
+
+        # The analysis tools of data_tools.py, each asked about the ten largest categories of the first level
+        labels = [subtree.root for subtree in full_tree.top_subtrees(10)]
+        with open(os.devnull, 'w') as devnull:
+            measure(prefix + 'display_full_tree', lambda _: full_tree.write_tree(devnull))
+        measure(prefix + 'search_value_in_tree', lambda _: [full_tree.search_value_in_tree(label) for label in labels])
+        measure(prefix + 'find_most_common_crime', lambda _: full_tree.find_most_common_crime())
+        measure(prefix + 'find_least_common_crime', lambda _: full_tree.find_least_common_crime())
+        measure(prefix + 'top_rankings', lambda _: full_tree.top_rankings(1, len(full_tree.subtrees)))
+        measure(prefix + 'top_specific', lambda _: [full_tree.top_specific(label) for label in labels])
+        measure(prefix + 'specific_ranked', lambda _: [full_tree.specific_ranked(label) for label in labels])
+        if columns[0] == 'OCC_HOUR':
+            crimes = [subtree.root for subtree in full_tree.subtrees[0].subtrees]
+            measure(prefix + 'crime_time_shift', lambda _: [full_tree.crime_time_shift(crime) for crime in crimes])
+
+        # Approximate rankings in one pass over the csv file, to compare with build_crime_tree_cold
+        measure(prefix + 'sketch_csv', lambda _: sketches.sketch_csv(columns, csv_path, BENCHMARK_MONTH))
+        measurements[-1][1].update(_sketch_accuracy(sketches.sketch_csv(columns, csv_path, BENCHMARK_MONTH),
+                                                    full_tree))
+
+    rd.clear_caches()
+    return measurements
+
+
+def _measure(setup: Callable[[], Any], run: Callable[[Any], Any], repeat: int, memory: bool) -> dict[str, float]:
+    """Return the best and mean wall time of run over repeat runs, each after an untimed setup, and its peak
+    traced memory if memory is True.
+    """
+    times = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start)
+    measurement = {'seconds': min(times), 'mean_seconds': sum(times) / len(times)}
+    if memory:
+        state = setup()
+        tracemalloc.start()
+        try:
+            run(state)
+            measurement['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return measurement
+
+
+def _sketch_accuracy(approximate: sketches.ApproximateTree, full_tree: Tree, k: int = 10) -> dict[str, float]:
+    """Return how closely the top k rankings of approximate, and the top 5 rankings of the subtrees of its most
+    frequent subtree, match those of full_tree, which was built from the same rows.
+
+    The recalls are the fractions of the exact top categories that are also in the approximate rankings, and
+    max_overestimate is the largest difference between an estimated and a true frequency among them.
+    """
+    k = min(k, len(full_tree.subtrees))
+    exact = {value for value, _ in full_tree.top_rankings(1, k).values()} if k > 0 else set()
+    estimated = approximate.top_rankings(1, k)
+    true_freqs = {subtree.root: subtree.freq for subtree in full_tree.subtrees}
+    accuracy = {
+        'top_recall': len(exact & {value for value, _ in estimated.values()}) / max(len(exact), 1),
+        'max_overestimate': max((freq - true_freqs.get(value, 0) for value, freq in estimated.values()), default=0),
+        'error_bound': approximate.error_bound(1)
+    }
+    if exact:
+        name, exact_specific = full_tree.top_specific(full_tree.top_rankings(1, 1)[1][0])
+        exact_top = {value for rank, (value, _) in exact_specific.items() if rank <= 5}
+        estimated_top = {value for rank, (value, _) in approximate.top_specific(name)[1].items() if rank <= 5}
+        accuracy['specific_recall'] = len(exact_top & estimated_top) / max(len(exact_top), 1)
+    return accuracy
+
+
+def _month_rows(store: column_store.ColumnStore, month: str, columns: list[str]) -> list[list[str]]:
+    """Return the raw values of the given columns of every row of the month, with hours already converted to
+    day/night like build_crime_tree used to do before inserting rows.
+    """
+    tables = []
+    for column in columns:
+        if column == 'OCC_HOUR':
+            day_or_night = column_rule(column)
+            tables.append([day_or_night(hour) for hour in store.labels[column]])
+        else:
+            tables.append(store.labels[column])
+    month_labels = store.labels['OCC_MONTH']
+    return [[table[code] for table, code in zip(tables, codes)]
+            for month_code, *codes in zip(store.column('OCC_MONTH'), *[store.column(column) for column in columns])
+            if month_labels[month_code].lower() == month.lower()]
+
+
+def _insert_rows(rows: list[list[str]], depth: int) -> Tree:
+    """Return a tree built by inserting every row one at a time with Tree.insert_data."""
+    tree = Tree('Benchmark', 0, [])
+    index_columns = list(range(depth))
+    # Hours are already converted to day/night, so every column only needs the default cleaning rule
+    tables = [LabelTable(DEFAULT_RULE) for _ in index_columns]
+    for row in rows:
+        tree.insert_data(row, index_columns, tables)
+    return tree
+
+
+def _crop(full_tree: Tree, depth: int) -> Tree:
+    """Return the cropped tree of full_tree, as build_crime_tree makes it."""
+    cropped_tree = Tree('Benchmark', full_tree.freq, [])
+    rd.crop_tree(full_tree, cropped_tree, rd.crop_levels(depth))
+    return cropped_tree
+
+
+def _current_commit() -> Optional[str]:
+    """Return the hash of the checked out git commit of this file's repository, or None if it is unknown."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(old: dict[str, Any], new: dict[str, Any], threshold: float = 1.1) -> bool:
+    """Print the time and memory of every phase in new relative to old and return whether no phase got slower
+    by more than the threshold ratio.
+    """
+    old_results = {(result['rows'], result['name']): result for result in old['results']}
+    no_regressions = True
+    print(f'{"rows":>10} {"phase":<45} {"old":>10} {"new":>10} {"ratio":>7} {"memory":>7}')
+    for result in new['results']:
+        previous = old_results.get((result['rows'], result['name']))
+        if previous is None:
+            continue
+        ratio = result['seconds'] / previous['seconds'] if previous['seconds'] > 0 else float('inf')
+        memory_ratio = ''
+        if 'peak_bytes' in result and previous.get('peak_bytes'):
+            memory_ratio = f'{result["peak_bytes"] / previous["peak_bytes"]:7.2f}'
+        flag = '  <-- slower' if ratio > threshold else ''
+        no_regressions = no_regressions and ratio <= threshold
+        print(f'{result["rows"]:>10} {result["name"]:<45} {previous["seconds"]:10.4f} {result["seconds"]:10.4f} '
+              f'{ratio:7.2f} {memory_ratio:>7}{flag}')
+    return no_regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the crime tree pipeline on synthetic datasets.')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help='sizes of the synthetic datasets, e.g. 100000 1000000 10000000')
+    parser.add_argument('--repeat', type=int, default=3, help='number of timed runs of every phase')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc run of every phase')
+    parser.add_argument('--seed', type=int, default=111, help='random seed of the synthetic datasets')
+    parser.add_argument('--data-dir', help='directory in which to keep and reuse the generated datasets')
+    parser.add_argument('--output', default='benchmark_results.json', help='file to write the results to')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files instead')
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help='slowdown ratio reported as a regression by --compare')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as old_file, open(args.compare[1]) as new_file:
+            passed = compare_results(json.load(old_file), json.load(new_file), args.threshold)
+        sys.exit(0 if passed else 1)
+
+    report = run_benchmarks(args.rows, args.repeat, not args.no_memory, args.seed, args.data_dir)
+    with open(args.output, 'w') as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f'\nResults written to {args.output}')
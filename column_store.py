@@ -0,0 +1,330 @@
+"""CSC111 Project 2: Columnar Crime Data Cache
+
+This file converts the columns of the crime dataset that are used for building trees into
+dictionary-encoded integer arrays, and the coordinate columns into arrays of floats. The arrays and their
+label tables are written to a cache directory and memory-mapped on later runs, so the csv file is only
+parsed again when its size or modification time changes.
+"""
+from __future__ import annotations
+from array import array
+from typing import Any, BinaryIO, Callable, Iterable, Optional
+import contextlib
+import csv
+import json
+import math
+import mmap
+import os
+from profiler import phase
+
+# The csv columns kept in the store, i.e. every column a tree can be built from plus the occurrence date
+STORE_COLUMNS = ['OCC_YEAR', 'OCC_MONTH', 'OCC_DAY', 'OCC_DOW', 'OCC_HOUR', 'DIVISION', 'LOCATION_TYPE',
+                 'PREMISES_TYPE', 'OFFENCE', 'MCI_CATEGORY', 'NEIGHBOURHOOD_158']
+# The csv columns of numbers kept in the store as floats instead of encoded labels, since almost every row has
+# its own value
+NUMBER_COLUMNS = ['LAT_WGS84', 'LONG_WGS84']
+CACHE_DIR = '.crime_cache'
+_FORMAT_VERSION = 3
+
+
+class ColumnStore:
+    """A read-only, dictionary-encoded copy of the store columns of the crime dataset.
+
+    Instance Attributes:
+    - num_rows: number of data rows in the csv file
+    - labels: maps each column name to its distinct raw values, where the position of a value is its code
+    - codes: maps each column name to the code of that column's value in every row, in file order
+    - numbers: maps each number column name to that column's value in every row (nan if it is not a number),
+      in file order
+
+    Representation Invariants:
+    - all(len(self.codes[column]) == self.num_rows for column in self.codes)
+    - all(0 <= code < len(self.labels[column]) for column in self.codes for code in self.codes[column])
+    - all(len(self.numbers[column]) == self.num_rows for column in self.numbers)
+    """
+    num_rows: int
+    labels: dict[str, list[str]]
+    codes: dict[str, memoryview | array]
+    numbers: dict[str, memoryview | array]
+    # Private Instance Attributes:
+    # - _mapped: the memory map backing self.codes and self.numbers, or None if they are plain arrays
+    _mapped: Optional[mmap.mmap]
+
+    def __init__(self, num_rows: int, labels: dict[str, list[str]], codes: dict[str, memoryview | array],
+                 numbers: dict[str, memoryview | array], mapped: Optional[mmap.mmap] = None) -> None:
+        """Initialize a new column store from already encoded columns."""
+        self.num_rows = num_rows
+        self.labels = labels
+        self.codes = codes
+        self.numbers = numbers
+        self._mapped = mapped
+
+    def column(self, name: str) -> memoryview | array:
+        """Return the codes of the given column.
+
+        Raise a ValueError if the column is not kept in the store, like list.index does for the title row.
+        """
+        if name not in self.codes:
+            raise ValueError(f'{name} is not a stored column')
+        return self.codes[name]
+
+    def number_column(self, name: str) -> memoryview | array:
+        """Return the values of the given number column.
+
+        Raise a ValueError if the column is not kept in the store, like column does.
+        """
+        if name not in self.numbers:
+            raise ValueError(f'{name} is not a stored number column')
+        return self.numbers[name]
+
+    def close(self) -> None:
+        """Release the memory map backing this store. The store must not be used afterwards."""
+        if self._mapped is not None:
+            for values in [*self.codes.values(), *self.numbers.values()]:
+                values.release()
+            self._mapped.close()
+            self._mapped = None
+
+
+def encode_rows(titles: list[str], rows: Iterable[list[str]]) -> ColumnStore:
+    """Return an in-memory column store of the given csv title row and data rows.
+
+    >>> titles = ['OCC_MONTH', 'OFFENCE']
+    >>> store = encode_rows(titles, [['May', 'Assault'], ['June', 'Robbery'], ['May', 'Robbery']])
+    >>> store.labels['OFFENCE']
+    ['Assault', 'Robbery']
+    >>> list(store.column('OFFENCE'))
+    [0, 1, 1]
+    >>> list(encode_rows(['LAT_WGS84'], [['43.65'], ['']]).number_column('LAT_WGS84'))
+    [43.65, nan]
+    """
+    stored = [column for column in STORE_COLUMNS if column in titles]
+    positions = [titles.index(column) for column in stored]
+    tables = [{} for _ in stored]
+    codes = [array('I') for _ in stored]
+    number_columns = [column for column in NUMBER_COLUMNS if column in titles]
+    number_positions = [titles.index(column) for column in number_columns]
+    numbers = [array('d') for _ in number_columns]
+    num_rows = 0
+
+    for row in rows:
+        for position, table, column_codes in zip(positions, tables, codes):
+            value = row[position]
+            code = table.get(value)
+            if code is None:
+                code = table[value] = len(table)
+            column_codes.append(code)
+        for position, values in zip(number_positions, numbers):
+            values.append(_parse_number(row[position]))
+        num_rows += 1
+
+    labels = {column: list(table) for column, table in zip(stored, tables)}
+    # Shrink every column to the smallest unsigned type that fits its codes
+    narrowed = {}
+    for column, column_codes in zip(stored, codes):
+        typecode = _typecode(len(labels[column]))
+        narrowed[column] = column_codes if typecode == 'I' else array(typecode, column_codes)
+    return ColumnStore(num_rows, labels, narrowed, dict(zip(number_columns, numbers)))
+
+
+def load_store(csv_path: str, cache_dir: str = CACHE_DIR) -> ColumnStore:
+    """Return the column store of the csv file at csv_path.
+
+    The store is memory-mapped from cache_dir if the cache there was built from a csv file of the same
+    size and modification time; otherwise the csv file is parsed and the cache is rewritten first.
+
+    Preconditions:
+        - csv_path is a valid crime dataset csv file
+    """
+    key = (os.path.abspath(csv_path), os.path.abspath(cache_dir))
+    fingerprint = csv_fingerprint(csv_path)
+    loaded = _loaded_stores.get(key)
+    if loaded is not None and loaded[0] == fingerprint:
+        return loaded[1]
+
+    meta_path, data_path = _cache_paths(csv_path, cache_dir)
+    with phase('column_store_load'):
+        store = _read_cache(meta_path, data_path, fingerprint)
+    if store is None:
+        with phase('csv_parse'), open(csv_path, 'r') as csv_file:
+            reader = csv.reader(csv_file)
+            titles = next(reader)
+            store = encode_rows(titles, reader)
+        _write_cache(store, meta_path, data_path, fingerprint)
+        # Swap the freshly parsed arrays for the memory-mapped copy so they can be freed
+        store = _read_cache(meta_path, data_path, fingerprint) or store
+
+    _loaded_stores[key] = (fingerprint, store)
+    return store
+
+
+# Stores already loaded by this process, keyed by (csv path, cache directory), with the fingerprint
+# of the csv file they were loaded from
+_loaded_stores: dict[tuple[str, str], tuple[dict[str, int], ColumnStore]] = {}
+
+
+def clear_loaded_stores() -> None:
+    """Close and forget the stores loaded by this process, so the next load_store reads its cache from disk again.
+
+    The stores returned by load_store before the call, and the columns read from them, must not be used
+    afterwards.
+    """
+    for _, store in _loaded_stores.values():
+        store.close()
+    _loaded_stores.clear()
+
+
+def csv_fingerprint(csv_path: str) -> dict[str, int]:
+    """Return the size and modification time of the csv file, used to detect when the cache is stale."""
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _parse_number(value: str) -> float:
+    """Return value as a float, or nan if it is not a number (e.g. a missing value)."""
+    try:
+        return float(value)
+    except ValueError:
+        return math.nan
+
+
+def _typecode(num_labels: int) -> str:
+    """Return the array typecode of the smallest unsigned type that can hold num_labels codes."""
+    if num_labels <= 1 << 8:
+        return 'B'
+    elif num_labels <= 1 << 16:
+        return 'H'
+    return 'I'
+
+
+def _cache_paths(csv_path: str, cache_dir: str) -> tuple[str, str]:
+    """Return the paths of the metadata file and the column data file caching csv_path."""
+    name = os.path.basename(csv_path)
+    return os.path.join(cache_dir, name + '.columns.json'), os.path.join(cache_dir, name + '.columns.bin')
+
+
+def _write_cache(store: ColumnStore, meta_path: str, data_path: str, fingerprint: dict[str, int]) -> None:
+    """Write the store to disk, replacing any previous cache atomically."""
+    def write_data(data_file: BinaryIO) -> dict[str, Any]:
+        """Write the columns of the store to data_file and return the metadata describing them."""
+        columns = {}
+        offset = 0
+        for column, column_codes in store.codes.items():
+            # Align every column so it can be cast from the memory map directly
+            padding = -offset % 8
+            data_file.write(bytes(padding))
+            offset += padding
+            typecode = _typecode(len(store.labels[column]))
+            data = array(typecode, column_codes).tobytes()
+            data_file.write(data)
+            columns[column] = {'typecode': typecode, 'offset': offset, 'labels': store.labels[column]}
+            offset += len(data)
+        numbers = {}
+        for column, values in store.numbers.items():
+            padding = -offset % 8
+            data_file.write(bytes(padding))
+            offset += padding
+            data = array('d', values).tobytes()
+            data_file.write(data)
+            numbers[column] = {'typecode': 'd', 'offset': offset}
+            offset += len(data)
+        return {'version': _FORMAT_VERSION, 'source': fingerprint, 'num_rows': store.num_rows, 'columns': columns,
+                'numbers': numbers}
+
+    write_cache_files(meta_path, data_path, write_data)
+
+
+def write_cache_files(meta_path: str, data_path: str, write_data: Callable[[BinaryIO], dict[str, Any]]) -> None:
+    """Write a cache made of a JSON metadata file and a binary data file, replacing any previous one atomically.
+
+    write_data writes the data file to the binary file it is given and returns the metadata describing it.
+    Readers must check the metadata before reading the data: a missing or outdated metadata file means there
+    is no valid cache.
+    """
+    os.makedirs(os.path.dirname(meta_path) or '.', exist_ok=True)
+    # Temporary files are named by process, so processes filling the same cache never write into each other's
+    temporary = f'.{os.getpid()}.tmp'
+    with open(data_path + temporary, 'wb') as data_file:
+        meta = write_data(data_file)
+    with open(meta_path + temporary, 'w') as meta_file:
+        json.dump(meta, meta_file)
+    # Drop the old metadata before replacing the data, so it never describes a data file it does not match
+    # Another process may be replacing the same cache and have removed it already
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(meta_path)
+    os.replace(data_path + temporary, data_path)
+    os.replace(meta_path + temporary, meta_path)
+
+
+def evict_least_recently_used(directory: str, suffix: str, cap: int) -> None:
+    """Remove the least recently used files in directory whose names end with suffix until their total size is
+    at most cap bytes. The most recently used file is always kept.
+
+    Files are ordered by modification time, so readers mark a file as used by touching it (see touch).
+    """
+    files = []
+    total = 0
+    for entry in os.scandir(directory):
+        if entry.name.endswith(suffix):
+            # Another process may have removed the file since the directory was listed
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            total += stat.st_size
+    files.sort()
+    for _, size, path in files[:-1]:
+        if total <= cap:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+
+def touch(path: str) -> bool:
+    """Mark the file at path as recently used for evict_least_recently_used, and return whether it exists."""
+    try:
+        os.utime(path)
+    except OSError:
+        return False
+    return True
+
+
+def _read_cache(meta_path: str, data_path: str, fingerprint: dict[str, int]) -> Optional[ColumnStore]:
+    """Return the store cached at the given paths, or None if there is no valid cache for fingerprint."""
+    try:
+        with open(meta_path, 'r') as meta_file:
+            meta = json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != _FORMAT_VERSION or meta.get('source') != fingerprint:
+        return None
+
+    num_rows = meta['num_rows']
+    labels = {column: info['labels'] for column, info in meta['columns'].items()}
+    if num_rows == 0:
+        # An empty file cannot be memory-mapped
+        codes = {column: array(info['typecode']) for column, info in meta['columns'].items()}
+        return ColumnStore(0, labels, codes, {column: array('d') for column in meta['numbers']})
+
+    try:
+        with open(data_path, 'rb') as data_file:
+            mapped = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    view = memoryview(mapped)
+    arrays = {}
+    for column, info in [*meta['columns'].items(), *meta['numbers'].items()]:
+        size = array(info['typecode']).itemsize * num_rows
+        arrays[column] = view[info['offset']:info['offset'] + size].cast(info['typecode'])
+    view.release()
+    codes = {column: arrays[column] for column in meta['columns']}
+    numbers = {column: arrays[column] for column in meta['numbers']}
+    return ColumnStore(num_rows, labels, codes, numbers, mapped)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod(verbose=True)
@@ -0,0 +1,334 @@
+"""CSC111 Project 2: Compact Crime Tree
+
+This file provides a frozen, array-backed form of a crime tree. Instead of one Python object per node, the
+nodes are stored in preorder across a few parallel arrays of 32-bit integers, and every distinct root value
+is stored once. It answers the same analysis queries as Tree, with the same results, in a fraction of the
+memory, so many month and hierarchy trees can be kept in memory at once.
+"""
+from __future__ import annotations
+from array import array
+from itertools import compress
+from typing import Callable, Optional
+from crime_tree import Tree, read_snapshot, write_snapshot
+
+# Index stored in place of a missing parent, child or sibling
+_NO_NODE = -1
+
+
+class CompactTree:
+    """A frozen crime tree stored as parallel arrays, one entry per node in preorder.
+
+    The node at index 0 is the root. The subtrees of a node are found by following first_child and then
+    next_sibling, in the same order as the subtrees of the Tree it was made from.
+
+    Instance Attributes:
+    - labels: every distinct root value of the tree
+    - label_ids: the index in labels of the root value of each node
+    - freqs: the frequency of each node
+    - parent: the index of the parent of each node, or -1 for the root
+    - first_child: the index of the first subtree of each node, or -1 for a leaf
+    - next_sibling: the index of the next subtree of the parent of each node, or -1 for the last one
+
+    Representation Invariants:
+    - len(self.label_ids) >= 1
+    - self.freqs, self.parent, self.first_child and self.next_sibling have the same length as self.label_ids
+    - self.parent[0] == -1
+    - all(self.parent[i] < i for i in range(1, len(self.parent)))
+
+    >>> tree = Tree("Root", 0, [])
+    >>> tree.insert_data(["Theft", "Day"], [0, 1])
+    >>> tree.insert_data(["Theft", "Night"], [0, 1])
+    >>> tree.insert_data(["Assault", "Day"], [0, 1])
+    >>> compact = CompactTree.from_tree(tree)
+    >>> compact.labels
+    ['Root', 'Theft', 'Day', 'Night', 'Assault']
+    >>> list(compact.parent), list(compact.first_child), list(compact.next_sibling)
+    ([-1, 0, 1, 1, 0, 4], [1, 2, -1, -1, 5, -1], [-1, 4, 3, -1, -1, -1])
+    >>> compact.search_value_in_tree("night")
+    (1, ['Root', 'Theft', 'Night'])
+    >>> compact.top_rankings(1, 2)
+    {1: ('Theft', 2), 2: ('Assault', 1)}
+    >>> str(compact.to_tree()) == str(tree)
+    True
+    """
+    labels: list[str]
+    label_ids: array
+    freqs: array
+    parent: array
+    first_child: array
+    next_sibling: array
+    # Private Instance Attributes:
+    # - _ranked_root: the subtrees of the root sorted by decreasing frequency, or None until first needed
+    _ranked_root: Optional[list[int]]
+
+    def __init__(self, labels: list[str], nodes: array) -> None:
+        """Initialize a new compact tree from a table of root values and its nodes in preorder, given as
+        (index of root value, frequency, number of subtrees) triples as in a Tree snapshot.
+
+        Raise a ValueError if nodes does not describe a single tree in preorder, or has a frequency of 2 ** 31
+        or more.
+
+        Preconditions:
+            - len(nodes) >= 3 and len(nodes) % 3 == 0
+        """
+        num_nodes = len(nodes) // 3
+        if max(nodes[1::3]) >= 1 << 31:
+            raise ValueError('frequency too large for a compact tree')
+        self.labels = labels
+        self.label_ids = nodes[0::3]
+        self.freqs = array('i', nodes[1::3])
+        self.parent = array('i', [_NO_NODE]) * num_nodes
+        self.first_child = array('i', [_NO_NODE]) * num_nodes
+        self.next_sibling = array('i', [_NO_NODE]) * num_nodes
+        self._ranked_root = None
+
+        num_subtrees = nodes[2::3]
+        # Each entry is [node, number of subtrees still to come, last subtree seen so far]
+        stack = [[0, num_subtrees[0], _NO_NODE]]
+        for i in range(1, num_nodes):
+            while stack and stack[-1][1] == 0:
+                stack.pop()
+            if not stack:
+                # Every node before this one already has all of its subtrees
+                raise ValueError('malformed tree snapshot')
+            top = stack[-1]
+            top[1] -= 1
+            self.parent[i] = top[0]
+            if top[2] == _NO_NODE:
+                self.first_child[top[0]] = i
+            else:
+                self.next_sibling[top[2]] = i
+            top[2] = i
+            stack.append([i, num_subtrees[i], _NO_NODE])
+
+    @classmethod
+    def from_tree(cls, tree: Tree) -> CompactTree:
+        """Return the compact form of tree.
+
+        Preconditions:
+            - every root value in the tree is a str
+            - every frequency in the tree is between 0 and 2 ** 31 - 1
+        """
+        return cls.from_bytes(tree.to_bytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> CompactTree:
+        """Return the compact form of the tree stored in the given snapshot made by Tree.to_bytes, without
+        building the tree itself.
+
+        Raise a ValueError if data is not a valid snapshot.
+        """
+        labels, nodes = read_snapshot(data)
+        return cls(labels, nodes)
+
+    def to_bytes(self) -> bytes:
+        """Return the snapshot of this tree, in the format of Tree.to_bytes."""
+        num_subtrees = array('I', bytes(4 * len(self.parent)))
+        for parent in self.parent[1:]:
+            num_subtrees[parent] += 1
+        nodes = array('I', bytes(12 * len(self.parent)))
+        nodes[0::3] = self.label_ids
+        nodes[1::3] = array('I', self.freqs)
+        nodes[2::3] = num_subtrees
+        return write_snapshot(self.labels, nodes)
+
+    def to_tree(self) -> Tree:
+        """Return this tree as a Tree."""
+        return Tree.from_bytes(self.to_bytes())
+
+    @property
+    def root(self) -> str:
+        """The root value of the root of this tree."""
+        return self.labels[self.label_ids[0]]
+
+    @property
+    def freq(self) -> int:
+        """The frequency of the root of this tree."""
+        return self.freqs[0]
+
+    def __len__(self) -> int:
+        """Return the number of nodes in this tree."""
+        return len(self.parent)
+
+    def children(self, node: int = 0) -> list[int]:
+        """Return the indices of the subtrees of the given node, in order.
+
+        Preconditions:
+            - 0 <= node < len(self)
+        """
+        children = []
+        child = self.first_child[node]
+        while child != _NO_NODE:
+            children.append(child)
+            child = self.next_sibling[child]
+        return children
+
+    def path(self, node: int) -> list[str]:
+        """Return the root values from the root of this tree down to the given node.
+
+        Preconditions:
+            - 0 <= node < len(self)
+        """
+        path = []
+        while node != _NO_NODE:
+            path.append(self.labels[self.label_ids[node]])
+            node = self.parent[node]
+        path.reverse()
+        return path
+
+    # General Analysis Tools
+    def search_value_in_tree(self, value: str, path: Optional[list[str]] = None) -> Optional[tuple[int, list[str]]]:
+        """Return the frequency of the given value in the tree and the path to its first occurrence, as
+        Tree.search_value_in_tree does.
+
+        >>> tree = Tree("Root", 0, [])
+        >>> tree.insert_data(["Theft", "Day"], [0, 1])
+        >>> tree.insert_data(["Assault", "Day"], [0, 1])
+        >>> compact = CompactTree.from_tree(tree)
+        >>> compact.search_value_in_tree("sault")
+        (1, ['Root', 'Assault'])
+        >>> compact.search_value_in_tree("Robbery") is None
+        True
+        """
+        if path is None:
+            path = []
+        value = value.lower()
+        # Match each distinct root value once, then find the first node in preorder with a matching one
+        matches = [value in label.lower() for label in self.labels]
+        node = next(compress(range(len(self.label_ids)), map(matches.__getitem__, self.label_ids)), None)
+        if node is None:
+            return None
+        return self.freqs[node], path + self.path(node)
+
+    def find_most_common_crime(self) -> tuple[int, list[str]]:
+        """Return the frequency and path of the most common crime in the tree.
+
+        >>> tree = Tree("Root", 0, [])
+        >>> tree.insert_data(["Theft", "Day"], [0, 1])
+        >>> tree.insert_data(["Theft", "Day"], [0, 1])
+        >>> tree.insert_data(["Assault", "Night"], [0, 1])
+        >>> CompactTree.from_tree(tree).find_most_common_crime()
+        (2, ['Root', 'Theft', 'Day'])
+        """
+        return self._find_extreme_commonality(max)
+
+    def find_least_common_crime(self) -> tuple[int, list[str]]:
+        """Return the frequency and path of the least common crime in the tree.
+
+        >>> tree = Tree("Root", 0, [])
+        >>> tree.insert_data(["Theft", "Day"], [0, 1])
+        >>> tree.insert_data(["Theft", "Day"], [0, 1])
+        >>> tree.insert_data(["Assault", "Night"], [0, 1])
+        >>> CompactTree.from_tree(tree).find_least_common_crime()
+        (1, ['Root', 'Assault', 'Night'])
+        """
+        return self._find_extreme_commonality(min)
+
+    def _find_extreme_commonality(self, extreme: Callable[..., int]) -> tuple[int, list[str]]:
+        """Return the frequency and path of the leaf with the extreme frequency chosen by extreme (max or min).
+
+        Like Tree, ties go to the first such leaf in preorder.
+        """
+        leaves = compress(range(len(self.first_child)), map(_NO_NODE.__eq__, self.first_child))
+        node = extreme(leaves, key=self.freqs.__getitem__)
+        return self.freqs[node], self.path(node)
+
+    # Specific Analysis Tools
+    def top_rankings(self, beginning: int, end: int) -> dict[int, tuple[str, int]]:
+        """Return the subtrees of the root ranked beginning to end by frequency, as Tree.top_rankings does.
+
+        Preconditions:
+            - 1 <= beginning <= end
+            - end <= len(self.children())
+        """
+        selected = self._ranked_children(0)[beginning - 1:end]
+        return {i + beginning: self._entry(node) for i, node in enumerate(selected)}
+
+    def top_specific(self, specific: str) -> tuple[str, dict[int, tuple[str, int]]]:
+        """Return the name of the subtree of the root matching specific and its subtrees ranked by frequency,
+        as Tree.top_specific does.
+
+        >>> tree = Tree("Root", 0, [])
+        >>> tree.insert_data(["Theft", "Day"], [0, 1])
+        >>> tree.insert_data(["Theft", "Night"], [0, 1])
+        >>> tree.insert_data(["Theft", "Night"], [0, 1])
+        >>> CompactTree.from_tree(tree).top_specific("theft")
+        ('Theft', {1: ('Night', 2), 2: ('Day', 1)})
+        """
+        result = self.search_value_in_tree(specific)
+        if result is None:
+            return '', {}
+        specific_node = result[1][-1]
+        node = self._child(0, specific_node)
+        if node is None:
+            return '', {}
+        return specific_node, {i + 1: self._entry(child) for i, child in enumerate(self._ranked_children(node))}
+
+    def crime_time_shift(self, crime_category: str) -> tuple[str, int, int]:
+        """Return the name of the given crime category and its frequencies in the day and night, as
+        Tree.crime_time_shift does.
+
+        >>> tree = Tree("Root", 0, [])
+        >>> tree.insert_data(["Day", "Theft"], [0, 1])
+        >>> tree.insert_data(["Night", "Theft"], [0, 1])
+        >>> tree.insert_data(["Day", "Assault"], [0, 1])
+        >>> CompactTree.from_tree(tree).crime_time_shift("Assault")
+        ('Assault', 1, 0)
+        """
+        result = self.search_value_in_tree(crime_category)
+        if result is None:
+            return '', 0, 0
+        specific_node = result[1][-1]
+
+        freqs = []
+        for time_of_day in ('day', 'night'):
+            time_node = next((child for child in self.children()
+                              if self.labels[self.label_ids[child]].lower() == time_of_day), None)
+            crime_node = None if time_node is None else self._child(time_node, crime_category)
+            freqs.append(0 if crime_node is None else self.freqs[crime_node])
+        return specific_node, freqs[0], freqs[1]
+
+    def specific_ranked(self, specific: str) -> tuple[str, int, int]:
+        """Return the name, rank and frequency of the given specific root value, as Tree.specific_ranked does.
+
+        >>> tree = Tree("Root", 0, [])
+        >>> tree.insert_data(["Theft", "Day"], [0, 1])
+        >>> tree.insert_data(["Theft", "Night"], [0, 1])
+        >>> tree.insert_data(["Assault", "Day"], [0, 1])
+        >>> CompactTree.from_tree(tree).specific_ranked("Assault")
+        ('Assault', 2, 1)
+        """
+        result = self.search_value_in_tree(specific)
+        if result is None:
+            return '', 0, 0
+        target_freq, path = result
+        # The rank is one more than the number of subtrees with a higher frequency
+        rank = 1 + sum(1 for child in self.children() if self.freqs[child] > target_freq)
+        return path[-1], rank, target_freq
+
+    def _child(self, node: int, label: str) -> Optional[int]:
+        """Return the first subtree of the given node with the given root value, or None if there is none."""
+        child = self.first_child[node]
+        while child != _NO_NODE:
+            if self.labels[self.label_ids[child]] == label:
+                return child
+            child = self.next_sibling[child]
+        return None
+
+    def _ranked_children(self, node: int) -> list[int]:
+        """Return the subtrees of the given node sorted by decreasing frequency, with ties in their order."""
+        if node == 0 and self._ranked_root is not None:
+            return self._ranked_root
+        ranked = sorted(self.children(node), key=self.freqs.__getitem__, reverse=True)
+        if node == 0:
+            self._ranked_root = ranked
+        return ranked
+
+    def _entry(self, node: int) -> tuple[str, int]:
+        """Return the root value and frequency of the given node."""
+        return self.labels[self.label_ids[node]], self.freqs[node]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
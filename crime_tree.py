@@ -5,11 +5,40 @@ The Tree class supports hierarchical data insertion, frequency-based analysis, a
 Additionally, it provides tools for visualizing the tree structure using Graphviz.
 """
 from __future__ import annotations
-from typing import Any, Optional
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Iterator, Optional, TextIO
+import bisect
 import graphviz
+import hashlib
+import heapq
+import html
 import os
+import shutil
+import struct
 import subprocess
+import sys
 import platform
+import threading
+from profiler import phase, profiled
+from normalize import LabelTable, clean_label
+from column_store import evict_least_recently_used, touch
+
+# Snapshot layout: magic, number of distinct root values, number of nodes
+_SNAPSHOT_MAGIC = b'CTR1'
+_SNAPSHOT_HEADER = struct.Struct('<4sII')
+# Top-k selection without a cached ordering uses a heap instead of a full sort when k is at most this
+# fraction of the number of subtrees
+_PARTIAL_SELECTION_RATIO = 8
+
+# Rendered visualizations are cached here, named by the hash of the tree structure; change _RENDER_VERSION
+# whenever Tree._add_nodes draws trees differently so older renders are not reused
+_RENDER_CACHE_DIR = os.path.join('visualizations', 'cache')
+_RENDER_VERSION = 'render-1'
+# Maximum total size of the cached renders, in bytes; the least recently used are removed past it
+RENDER_CACHE_CAP = 64 * 1024 * 1024
+# A single background worker renders visualizations one at a time, in the order they were requested
+_render_executor = ThreadPoolExecutor(max_workers=1)
 
 
 class Tree:
@@ -19,10 +48,31 @@ class Tree:
     - freq: frequency of node (larger value means larger size)
     - subtrees: list of subtrees of the node
 
+    Representation Invariants:
+    - every subtree in self.subtrees that has been indexed is reachable through self._children
+      by its root value (the first such subtree wins if two share a root value)
     """
+    __slots__ = ('root', 'freq', 'subtrees', '_children', '_indexed', '_indexed_list', '_search_index',
+                 '_ranked', '_version')
     root: Optional[Any]
     freq: int
     subtrees: list[Tree]
+    # Private Instance Attributes:
+    # - _children: maps the root value of each subtree to that subtree
+    # - _indexed: how many entries of self.subtrees have been added to _children
+    # - _indexed_list: the list object _children was built from, so replacing self.subtrees resets the index
+    _children: dict[Any, Tree]
+    _indexed: int
+    _indexed_list: Optional[list[Tree]]
+    # - _search_index: the label search index of this tree built by search_value_in_tree, or None
+    # - _ranked: self.subtrees sorted by decreasing frequency, or None if it has not been sorted since the
+    #   last change
+    _search_index: Optional[_SearchIndex]
+    _ranked: Optional[list[Tree]]
+    # - _version: a one-element list counting the insertions into and merges with the nodes of this tree. Nodes
+    #   added by insert_path, merge and from_bytes share the list of their tree, so a search index built on an
+    #   ancestor notices changes made to its subtrees while other trees are not affected
+    _version: list[int]
 
     def __init__(self, root: Optional[Any], freq: int, subtrees: list[Tree]) -> None:
         """Initialize a new Tree with the given root value and subtrees.
@@ -35,60 +85,254 @@ class Tree:
         self.root = root
         self.freq = freq
         self.subtrees = subtrees
+        self._children = {}
+        self._indexed = 0
+        self._indexed_list = subtrees
+        self._search_index = None
+        self._ranked = None
+        self._version = [0]
 
     # Building Tree Methods
-    def insert_data(self, crime_data: list, index_columns: list) -> None:
+    def insert_data(self, crime_data: list, index_columns: list, tables: Optional[list[LabelTable]] = None) -> None:
         """Insert the input crime data into the tree based on the user-selected hierarchy
 
+        The value of each column is cleaned with the label table of the same position in tables, such as
+        the tables of normalize.COLUMN_RULES, or with normalize.clean_label if tables is None.
+
         Preconditions:
             - self.root is not None
             - crime_data != []
             - index_columns != []
+            - tables is None or len(tables) == len(index_columns)
+
+        >>> tree = Tree("Root", 0, [])
+        >>> from normalize import day_or_night
+        >>> tables = [LabelTable(clean_label), LabelTable(day_or_night)]
+        >>> tree.insert_data(["Annex (95)", "19"], [0, 1], tables)
+        >>> print(tree, end='')
+        Root (1)
+          Annex (1)
+            Night (1)
         """
-        # If the category is a name of a location modify it
-        if crime_data[index_columns[0]][-1] == ')':
-            loc_name = crime_data[index_columns[0]].split()
-            loc_name.pop()
-            cat = ' '.join(loc_name)
+        if tables is None:
+            self.insert_path([clean_label(crime_data[column]) for column in index_columns])
         else:
-            cat = crime_data[index_columns[0]]
-        # If in this depth of the tree which is about a column in the dataset,
-        # the category of the crime data associated with this column does not exist,
-        # insert the category in this depth and recurse in this new subtree
-        if not (cat in [subtree.root for subtree in self.subtrees]):
-            # Create a new subtree for the category
-            new_tree = Tree(cat, 0, [])
-            # If other categories remain in the crime data, recurse through them
-            if len(index_columns) > 1:
-                new_tree.insert_data(crime_data, index_columns[1:])
-            # Otherwise, set the frequency of the subtree to 1 (leaf of the tree)
+            self.insert_path([table[crime_data[column]] for column, table in zip(index_columns, tables)])
+
+    def insert_path(self, path: list, count: int = 1) -> None:
+        """Insert count occurrences of the given path of categories into the tree.
+
+        Unlike insert_data, the categories are used as they are, without cleaning.
+
+        Preconditions:
+            - self.root is not None
+            - path != []
+            - count >= 1
+
+        >>> tree = Tree("Root", 0, [])
+        >>> tree.insert_path(["Theft", "Day"], 3)
+        >>> tree.insert_path(["Theft", "Night"])
+        >>> print(tree, end='')
+        Root (4)
+          Theft (4)
+            Day (3)
+            Night (1)
+        """
+        self._version[0] += 1
+        # Walk down one level per category, creating the category's subtree when it does not exist yet
+        # and adding count to the frequency of every node on the path (the leaf included)
+        node = self
+        for cat in path:
+            node.freq += count
+            node._search_index = None
+            node._ranked = None
+            child = node._child(cat)
+            if child is None:
+                child = node._add_child(cat)
+            node = child
+        node.freq += count
+
+    def merge(self, other: Tree) -> None:
+        """Add the frequencies of other into this tree, summing them along matching paths of categories.
+
+        Subtrees of other that have no match in this tree are copied in after the existing subtrees,
+        in their order in other, so merging the trees of consecutive parts of the data in order gives
+        the same tree as inserting all of the data into one tree.
+
+        >>> tree = Tree("Root", 0, [])
+        >>> tree.insert_data(["Theft", "Day"], [0, 1])
+        >>> other = Tree("Root", 0, [])
+        >>> other.insert_data(["Assault", "Day"], [0, 1])
+        >>> other.insert_data(["Theft", "Night"], [0, 1])
+        >>> tree.merge(other)
+        >>> print(tree, end='')
+        Root (3)
+          Theft (2)
+            Day (1)
+            Night (1)
+          Assault (1)
+            Day (1)
+        """
+        self._version[0] += 1
+        self.freq += other.freq
+        self._search_index = None
+        self._ranked = None
+        for subtree in other.subtrees:
+            child = self._child(subtree.root)
+            if child is None:
+                child = self._add_child(subtree.root)
+            child.merge(subtree)
+
+    def _child(self, cat: Any) -> Optional[Tree]:
+        """Return the subtree whose root is cat, or None if there is no such subtree.
+
+        Subtrees appended to self.subtrees directly (e.g. by render_data.crop_tree) are indexed
+        lazily the next time this method is called, and so is a new list assigned to self.subtrees.
+        """
+        self._sync()
+        return self._children.get(cat)
+
+    def _add_child(self, cat: Any) -> Tree:
+        """Append a new empty subtree with root cat and return it.
+
+        Preconditions:
+            - self._child(cat) is None
+        """
+        new_tree = Tree(cat, 0, [])
+        new_tree._version = self._version
+        self.subtrees.append(new_tree)
+        self._children[cat] = new_tree
+        self._indexed += 1
+        self._ranked = None
+        return new_tree
+
+    def _reindex(self) -> None:
+        """Bring self._children up to date with self.subtrees."""
+        if self._indexed > len(self.subtrees) or self._indexed_list is not self.subtrees:
+            # Subtrees were removed or replaced, so start over
+            self._children = {}
+            self._indexed = 0
+            self._indexed_list = self.subtrees
+        for subtree in self.subtrees[self._indexed:]:
+            self._children.setdefault(subtree.root, subtree)
+        self._indexed = len(self.subtrees)
+        self._ranked = None
+
+    def top_subtrees(self, k: int, later_first: bool = False) -> list[Tree]:
+        """Return the (at most) k subtrees with the highest frequencies, highest first.
+
+        Subtrees with equal frequencies keep their order in self.subtrees, or the reverse of it if later_first
+        is True. The full ordering of the subtrees is cached until the tree changes; without it, a small k
+        is answered by partial selection instead of sorting every subtree.
+
+        Preconditions:
+            - k >= 0
+
+        >>> tree = Tree("Root", 0, [])
+        >>> for crime in ["Theft", "Assault", "Theft", "Robbery", "Fraud"]:
+        ...     tree.insert_data([crime], [0])
+        >>> [subtree.root for subtree in tree.top_subtrees(3)]
+        ['Theft', 'Assault', 'Robbery']
+        >>> [subtree.root for subtree in tree.top_subtrees(3, later_first=True)]
+        ['Theft', 'Fraud', 'Robbery']
+        """
+        self._sync()
+        if self._ranked is None and k * _PARTIAL_SELECTION_RATIO < len(self.subtrees):
+            if later_first:
+                top = heapq.nlargest(k, enumerate(self.subtrees), key=lambda item: (item[1].freq, item[0]))
             else:
-                new_tree.freq = 1
-            # Add the new subtree to the list of the subtrees
-            self.subtrees.append(new_tree)
-            # Increment the frequency of the current root
-            self.freq += 1
-        # If in this depth of the tree which is about a column in the dataset,
-        # the category of the crime data associated with this column does exist,
-        # recurse into that subtree
-        else:
-            # Use a while loop to iterate through the subtrees
-            early_stop = False
-            index = 0
-            while not early_stop:
-                # If the category of the crime data matches a subtree
-                if self.subtrees[index].root == cat:
-                    # If there are other categries in the crime data, recurse through them
-                    if len(index_columns) > 1:
-                        self.subtrees[index].insert_data(crime_data, index_columns[1:])
-                    # Otherwise, increment the subtree frequency by 1 (leaf of the tree)
-                    else:
-                        self.subtrees[index].freq += 1
-                    # Exit the loop early because we recursed through the proper subtree and we are done
-                    early_stop = True
-                index += 1
-            # Increment the frequency of the current root
-            self.freq += 1
+                top = heapq.nlargest(k, enumerate(self.subtrees), key=lambda item: (item[1].freq, -item[0]))
+            return [subtree for _, subtree in top]
+
+        ranked = self._ranked_subtrees()
+        if not later_first:
+            return ranked[:k]
+        # Reverse every run of equal frequencies that starts within the first k subtrees
+        top = []
+        start = 0
+        while start < min(k, len(ranked)):
+            end = start + 1
+            while end < len(ranked) and ranked[end].freq == ranked[start].freq:
+                end += 1
+            top.extend(reversed(ranked[start:end]))
+            start = end
+        return top[:k]
+
+    def _ranked_subtrees(self) -> list[Tree]:
+        """Return self.subtrees sorted by decreasing frequency, with ties in their order in self.subtrees.
+
+        The returned list is cached and must not be mutated.
+        """
+        self._sync()
+        if self._ranked is None:
+            self._ranked = sorted(self.subtrees, key=lambda x: x.freq, reverse=True)
+        return self._ranked
+
+    def _sync(self) -> None:
+        """Bring the cached child index and ordering up to date with subtrees appended or assigned directly."""
+        if self._indexed != len(self.subtrees) or self._indexed_list is not self.subtrees:
+            self._reindex()
+
+    # Snapshot Methods
+    def to_bytes(self) -> bytes:
+        """Return a compact binary snapshot of the tree, which Tree.from_bytes turns back into an equal tree.
+
+        The snapshot holds a table of the distinct root values followed by every node in preorder as
+        (root value id, frequency, number of subtrees), all as unsigned 32-bit integers.
+
+        Preconditions:
+            - every root value in the tree is a str
+            - every frequency in the tree is between 0 and 2 ** 32 - 1
+        """
+        label_ids = {}
+        nodes = array('I')
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            label_id = label_ids.setdefault(node.root, len(label_ids))
+            nodes.extend((label_id, node.freq, len(node.subtrees)))
+            stack.extend(reversed(node.subtrees))
+
+        return write_snapshot(list(label_ids), nodes)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> Tree:
+        """Return the tree stored in the given snapshot made by Tree.to_bytes.
+
+        Raise a ValueError if data is not a valid snapshot.
+
+        >>> tree = Tree("Root", 0, [])
+        >>> tree.insert_data(["Theft", "Day"], [0, 1])
+        >>> tree.insert_data(["Assault", "Day"], [0, 1])
+        >>> print(Tree.from_bytes(tree.to_bytes()), end='')
+        Root (2)
+          Theft (1)
+            Day (1)
+          Assault (1)
+            Day (1)
+        >>> Tree.from_bytes(write_snapshot(['Root', 'Theft'], array('I', [0, 1, 0, 1, 1, 2, 1, 1, 0])))
+        Traceback (most recent call last):
+        ...
+        ValueError: malformed tree snapshot
+        """
+        labels, nodes = read_snapshot(data)
+
+        # Rebuild the tree in preorder, keeping the nodes that still expect subtrees on a stack
+        root = cls(labels[nodes[0]], nodes[1], [])
+        stack = [(root, nodes[2])]
+        for i in range(3, len(nodes), 3):
+            while stack and stack[-1][1] == 0:
+                stack.pop()
+            if not stack:
+                # Every node before this one already has all of its subtrees
+                raise ValueError('malformed tree snapshot')
+            parent, remaining = stack[-1]
+            stack[-1] = (parent, remaining - 1)
+            node = cls(labels[nodes[i]], nodes[i + 1], [])
+            node._version = root._version
+            parent.subtrees.append(node)
+            stack.append((node, nodes[i + 2]))
+        return root
 
     # General Analysis Tools
     def __str__(self, level: int = 0) -> str:
@@ -97,20 +341,57 @@ class Tree:
         Preconditions:
             - level >= 0  # The level must be a non-negative integer
         """
-        indent = '  ' * level
-        result = f"{indent}{self.root} ({self.freq})\n"
-        for subtree in self.subtrees:
-            result += subtree.__str__(level + 1)
-        return result
+        return ''.join(self.iter_lines(level))
+
+    def iter_lines(self, level: int = 0, max_depth: Optional[int] = None, min_freq: int = 0) -> Iterator[str]:
+        """Yield the lines of the string representation of the tree one at a time, each ending in a newline.
+
+        Only nodes at most max_depth levels below the root are included (all of them if max_depth is None),
+        and subtrees with a frequency below min_freq are left out along with everything under them.
+        The tree is walked with an explicit stack, so the depth of the tree is not limited by the recursion limit.
+
+        Preconditions:
+            - level >= 0
+            - max_depth is None or max_depth >= 0
+
+        >>> tree = Tree("Root", 0, [])
+        >>> tree.insert_data(["Theft", "Day"], [0, 1])
+        >>> tree.insert_data(["Theft", "Night"], [0, 1])
+        >>> tree.insert_data(["Assault", "Day"], [0, 1])
+        >>> list(tree.iter_lines(max_depth=1))
+        ['Root (3)\\n', '  Theft (2)\\n', '  Assault (1)\\n']
+        >>> list(tree.iter_lines(min_freq=2))
+        ['Root (3)\\n', '  Theft (2)\\n']
+        """
+        stack = [(self, level)]
+        while stack:
+            node, depth = stack.pop()
+            yield f"{'  ' * depth}{node.root} ({node.freq})\n"
+            if max_depth is None or depth - level < max_depth:
+                stack.extend((subtree, depth + 1) for subtree in reversed(node.subtrees) if subtree.freq >= min_freq)
+
+    def write_tree(self, file: Optional[TextIO] = None, max_depth: Optional[int] = None, min_freq: int = 0) -> None:
+        """Write the string representation of the tree to file (the console if file is None) line by line
+        as it is produced, with the same max_depth and min_freq options as Tree.iter_lines.
+        """
+        if file is None:
+            file = sys.stdout
+        file.writelines(self.iter_lines(max_depth=max_depth, min_freq=min_freq))
 
-    def display_full_tree(self) -> None:
-        """Prints the full tree in the console using Tree.__str__."""
-        print(self.__str__())
+    def display_full_tree(self, max_depth: Optional[int] = None, min_freq: int = 0) -> None:
+        """Prints the full tree in the console, streaming it line by line with Tree.write_tree."""
+        self.write_tree(max_depth=max_depth, min_freq=min_freq)
+        print()
 
+    @profiled('query.search_value_in_tree')
     def search_value_in_tree(self, value: str, path: Optional[list[str]] = None) -> Optional[tuple[int, list[str]]]:
         """Return the frequency of the given value in the tree and the path to its first occurrence.
 
-        If the value is not found, return None.
+        The first occurrence is the first node in a depth-first (preorder) walk of the tree whose root contains
+        value, ignoring case. If the value is not found, return None.
+
+        The walk is answered from a search index of every substring of every root value in the tree, built on
+        the first search and rebuilt after data is inserted into or merged with this tree or any of its subtrees.
 
         >>> tree = Tree("Root", 0, [])
         >>> tree.insert_data(["Theft", "Day"], [0, 1])
@@ -119,20 +400,31 @@ class Tree:
         (2, ['Root', 'Theft'])
         >>> tree.search_value_in_tree("Day")
         (1, ['Root', 'Theft', 'Day'])
+        >>> tree.insert_data(["Assault", "Day"], [0, 1])
+        >>> tree.search_value_in_tree("sault")
+        (1, ['Root', 'Assault'])
+        >>> tree.search_value_in_tree("Robbery") is None
+        True
+        >>> tree.subtrees[0].insert_path(["Evening"])
+        >>> tree.search_value_in_tree("Evening")
+        (1, ['Root', 'Theft', 'Evening'])
+        >>> index = tree._search_index
+        >>> Tree("Other", 0, []).insert_path(["Theft"])
+        >>> tree.search_value_in_tree("Evening") is not None and tree._search_index is index
+        True
         """
         if path is None:
             path = []
 
-        if self.root is not None and value.lower() in self.root.lower():
-            return self.freq, path + [self.root]
-        else:
-            for subtree in self.subtrees:
-                result = subtree.search_value_in_tree(value, path + [self.root])
-                if result is not None:
-                    return result
-
-        return None
+        index = self._search_index
+        if index is None or not index.is_current(self):
+            index = self._search_index = _SearchIndex(self)
+        result = index.find(value)
+        if result is None:
+            return None
+        return result[0], path + result[1]
 
+    @profiled('query.find_most_common_crime')
     def find_most_common_crime(self) -> tuple[int, list[str]]:
         """Return the frequency and path of the most common crime in the tree.
 
@@ -146,6 +438,7 @@ class Tree:
         """
         return self._find_extreme_commonality(find_max=True)
 
+    @profiled('query.find_least_common_crime')
     def find_least_common_crime(self) -> tuple[int, list[str]]:
         """Return the frequency and path of the least common crime in the tree.
 
@@ -185,6 +478,7 @@ class Tree:
             return extreme_freq, extreme_path
 
     # Specific Analysis Tools
+    @profiled('query.top_rankings')
     def top_rankings(self, beginning: int, end: int) -> dict[int, tuple[str, int]]:
         """Return a dictionary of the children of the root with the highest frequency within the given range.
         The dictionary key should be its numerical ranking mapped to a tuple of the node's root value and frequency.
@@ -201,10 +495,10 @@ class Tree:
         {1: ('Theft', 2), 2: ('Assault', 1)}
         """
 
-        sorted_subtrees = sorted(self.subtrees, key=lambda x: x.freq, reverse=True)
-        selected_subtrees = sorted_subtrees[beginning - 1:end]
+        selected_subtrees = self.top_subtrees(end)[beginning - 1:]
         return {i + beginning: (subtree.root, subtree.freq) for i, subtree in enumerate(selected_subtrees)}
 
+    @profiled('query.top_specific')
     def top_specific(self, specific: str) -> tuple[str, dict[int, tuple[str, int]]]:
         """Return the name of the specific root and a dictionary of the top 5 children of the given specific input
         with the highest frequency. The dictionary key should be its numerical ranking mapped to a
@@ -224,13 +518,14 @@ class Tree:
         if specific_subtree is None:
             return '', {}
         specific_node = specific_subtree[1][-1]
-        specific_tree = next((subtree for subtree in self.subtrees if subtree.root == specific_node), None)
+        specific_tree = self._child(specific_node)
         if specific_tree is None:
             return '', {}
 
-        sorted_subtrees = sorted(specific_tree.subtrees, key=lambda x: x.freq, reverse=True)[:]
+        sorted_subtrees = specific_tree._ranked_subtrees()
         return specific_node, {i + 1: (subtree.root, subtree.freq) for i, subtree in enumerate(sorted_subtrees)}
 
+    @profiled('query.crime_time_shift')
     def crime_time_shift(self, crime_category: str) -> tuple[str, int, int]:
         """Return a tuple containing the name of the root and the frequency of crime occurrences
         in the day and night for the given crime category.
@@ -258,17 +553,18 @@ class Tree:
         night_freq = 0
 
         if day_tree is not None:
-            crime_subtree = next((subtree for subtree in day_tree.subtrees if subtree.root == crime_category), None)
+            crime_subtree = day_tree._child(crime_category)
             if crime_subtree is not None:
                 day_freq = crime_subtree.freq
 
         if night_tree is not None:
-            crime_subtree = next((subtree for subtree in night_tree.subtrees if subtree.root == crime_category), None)
+            crime_subtree = night_tree._child(crime_category)
             if crime_subtree is not None:
                 night_freq = crime_subtree.freq
 
         return specific_node, day_freq, night_freq
 
+    @profiled('query.specific_ranked')
     def specific_ranked(self, specific: str) -> tuple[str, int, int]:
         """Return a tuple containing the name of root, rank, in terms of frequency,
         and numeric frequency of the given specific root value.
@@ -290,28 +586,179 @@ class Tree:
             return ('', 0, 0)
         name = specific_subtree[-1][-1]
         target_freq = specific_subtree[0]
-        rank = 1
-        for subtree in self.subtrees:
-            if subtree.freq > target_freq:
-                rank += 1
+        # The rank is one more than the number of subtrees with a higher frequency
+        rank = 1 + bisect.bisect_left(self._ranked_subtrees(), -target_freq, key=lambda x: -x.freq)
 
         return name, rank, target_freq
 
     # Graphviz Visualization
-    def visualize(self) -> None:
-        """Visualize the tree using Graphviz."""
-        dot = graphviz.Digraph()
-        self._add_nodes(dot)
-        output_file = os.path.join('visualizations', 'tree_visualization')
-        dot.render(output_file, format='svg', cleanup=False)
-
-        # Cross-platform file opening
-        if platform.system() == 'Windows':
-            os.startfile(output_file + '.svg')
-        elif platform.system() == 'Darwin':  # macOS
-            subprocess.run(['open', output_file + '.svg'])
-        else:  # Linux and other systems
-            subprocess.run(['xdg-open', output_file + '.svg'])
+    def visualize(self, max_nodes: Optional[int] = None) -> Future:
+        """Visualize the tree using Graphviz.
+
+        The graph is built and rendered by a background worker, so this returns right away with a future that
+        holds the path of the svg file once it has been opened. Rendered svg files are cached on disk under a
+        hash of the tree's structure, so visualizing an identical tree again skips Graphviz entirely.
+
+        If max_nodes is given, the level of detail of the tree is reduced to at most max_nodes nodes first
+        (see Tree.level_of_detail), which keeps the Graphviz layout time bounded for large trees.
+
+        Preconditions:
+            - max_nodes is None or max_nodes >= 2
+            - the tree is not mutated until the returned future is done
+        """
+        return _render_executor.submit(self._render_and_open, max_nodes)
+
+    def visualize_sharded(self, max_nodes: int = 200) -> Future:
+        """Visualize the tree as one svg file per subtree of the root plus an overview, linked from an index page.
+
+        Like Tree.visualize, this runs in the background and returns a future, which holds the path of the
+        index page once it has been opened. The overview shows the root and its subtrees, and every svg file
+        has at most max_nodes nodes (see Tree.level_of_detail).
+
+        Preconditions:
+            - max_nodes >= 2
+            - the tree is not mutated until the returned future is done
+        """
+        return _render_executor.submit(self._render_shards, max_nodes)
+
+    def level_of_detail(self, max_nodes: int) -> Tree:
+        """Return a copy of the tree with at most max_nodes nodes.
+
+        Nodes are kept from the highest frequency down. The subtrees of a node that do not fit are collapsed
+        into a single subtree named 'other (N)', where N is the number of subtrees it replaces and its frequency
+        is the sum of theirs. Kept subtrees stay in their original order, followed by the collapsed one.
+
+        Preconditions:
+            - max_nodes >= 2
+
+        >>> tree = Tree("Root", 0, [])
+        >>> for crime in ["Theft", "Theft", "Theft", "Assault", "Assault", "Robbery", "Fraud"]:
+        ...     tree.insert_data([crime, "Day"], [0, 1])
+        >>> print(tree.level_of_detail(5), end='')
+        Root (7)
+          Theft (3)
+            Day (3)
+          other (3) (4)
+        >>> print(tree.level_of_detail(3), end='')
+        Root (7)
+          other (4) (7)
+        """
+        # Number the original nodes in the order they are kept, expanding the highest frequencies first
+        kept = {id(self): []}
+        num_kept = 1
+        # Each kept node whose subtrees are not all kept needs room for an 'other' node
+        hidden = {id(self): len(self.subtrees)}
+        reserved = 1 if self.subtrees else 0
+        candidates = [(-subtree.freq, i, subtree, self) for i, subtree in enumerate(self.subtrees)]
+        heapq.heapify(candidates)
+        sequence = len(candidates)
+
+        while candidates:
+            _, _, node, parent = candidates[0]
+            cost = 1 + (1 if node.subtrees else 0) - (1 if hidden[id(parent)] == 1 else 0)
+            if num_kept + reserved + cost > max_nodes:
+                break
+            heapq.heappop(candidates)
+            kept[id(parent)].append(node)
+            kept[id(node)] = []
+            hidden[id(parent)] -= 1
+            hidden[id(node)] = len(node.subtrees)
+            num_kept += 1
+            reserved += cost - 1
+            for subtree in node.subtrees:
+                heapq.heappush(candidates, (-subtree.freq, sequence, subtree, node))
+                sequence += 1
+
+        # Copy the kept nodes, in their original order, with an 'other' node for each group of collapsed subtrees
+        copy = Tree(self.root, self.freq, [])
+        stack = [(self, copy)]
+        while stack:
+            node, node_copy = stack.pop()
+            kept_ids = {id(subtree) for subtree in kept[id(node)]}
+            other_count = 0
+            other_freq = 0
+            for subtree in node.subtrees:
+                if id(subtree) in kept_ids:
+                    subtree_copy = Tree(subtree.root, subtree.freq, [])
+                    node_copy.subtrees.append(subtree_copy)
+                    stack.append((subtree, subtree_copy))
+                else:
+                    other_count += 1
+                    other_freq += subtree.freq
+            if other_count > 0:
+                node_copy.subtrees.append(Tree(f'other ({other_count})', other_freq, []))
+        return copy
+
+    def structure_hash(self) -> str:
+        """Return a hash of the root values, frequencies and shape of the tree, which is everything its
+        visualization depends on.
+        """
+        digest = hashlib.sha256(_RENDER_VERSION.encode())
+        stack = [(self, 0)]
+        while stack:
+            node, level = stack.pop()
+            digest.update(f'{level}\t{node.root}\t{node.freq}\n'.encode())
+            stack.extend((subtree, level + 1) for subtree in reversed(node.subtrees))
+        return digest.hexdigest()
+
+    def _render_and_open(self, max_nodes: Optional[int]) -> str:
+        """Render the tree (with its level of detail reduced to max_nodes nodes, if given), copy it to the usual
+        output file and open it. Return the path of the opened file.
+        """
+        tree = self if max_nodes is None else self.level_of_detail(max_nodes)
+        output_file = os.path.join('visualizations', 'tree_visualization.svg')
+        shutil.copyfile(tree._render(), output_file)
+        _open_file(output_file)
+        return output_file
+
+    def _render_shards(self, max_nodes: int) -> str:
+        """Render the overview and the subtrees of the root to separate svg files, write the index page linking
+        them and open it. Return the path of the index page.
+        """
+        shard_dir = os.path.join('visualizations', 'shards')
+        os.makedirs(shard_dir, exist_ok=True)
+        # Remove the shards of a previous tree, which may have had more subtrees
+        for entry in os.scandir(shard_dir):
+            if entry.name.endswith('.svg'):
+                os.remove(entry.path)
+
+        overview = Tree(self.root, self.freq, [Tree(subtree.root, subtree.freq, []) for subtree in self.subtrees])
+        shutil.copyfile(overview.level_of_detail(max_nodes)._render(), os.path.join(shard_dir, 'overview.svg'))
+        links = []
+        for i, subtree in enumerate(self.subtrees):
+            shutil.copyfile(subtree.level_of_detail(max_nodes)._render(), os.path.join(shard_dir, f'{i + 1}.svg'))
+            links.append(f'<li><a href="shards/{i + 1}.svg">{html.escape(str(subtree.root))} '
+                         f'({subtree.freq})</a></li>')
+
+        title = html.escape(f'{self.root} ({self.freq})')
+        index_file = os.path.join('visualizations', 'tree_index.html')
+        with open(index_file, 'w', encoding='utf-8') as index:
+            index.write(f'<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8"><title>{title}</title></head>\n'
+                        f'<body>\n<h1>{title}</h1>\n<img src="shards/overview.svg" alt="Overview" width="100%">\n'
+                        f'<ol>\n' + '\n'.join(links) + '\n</ol>\n</body>\n</html>\n')
+        _open_file(index_file)
+        return index_file
+
+    def _render(self) -> str:
+        """Render the tree to the svg cache unless it is already there and return the path of the cached file.
+
+        The least recently used renders are removed once the cache grows past RENDER_CACHE_CAP bytes.
+        """
+        os.makedirs(_RENDER_CACHE_DIR, exist_ok=True)
+        digest = self.structure_hash()
+        cached_file = os.path.join(_RENDER_CACHE_DIR, digest + '.svg')
+        # Mark a cached render as recently used, so it is the last to be evicted
+        if not touch(cached_file):
+            dot = graphviz.Digraph()
+            with phase('add_nodes'):
+                self._add_nodes(dot)
+            # Render under a temporary name, so an interrupted render never leaves a partial file in the cache
+            temporary_file = os.path.join(_RENDER_CACHE_DIR, f'{digest}.{os.getpid()}.{threading.get_ident()}')
+            with phase('dot_render'):
+                dot.render(temporary_file, format='svg', cleanup=True)
+            os.replace(temporary_file + '.svg', cached_file)
+            evict_least_recently_used(_RENDER_CACHE_DIR, '.svg', RENDER_CACHE_CAP)
+        return cached_file
 
     def _add_nodes(self, dot: graphviz.Digraph, parent_id: Optional[str] = None, level: int = 0) -> None:
         """Add nodes to the Graphviz Digraph for visualization.
@@ -346,6 +793,146 @@ class Tree:
             subtree._add_nodes(dot, node_id, level + 1)
 
 
+def _open_file(path: str) -> None:
+    """Open the file at path with the default application of the system."""
+    # Cross-platform file opening
+    if platform.system() == 'Windows':
+        os.startfile(path)
+    elif platform.system() == 'Darwin':  # macOS
+        subprocess.run(['open', path])
+    else:  # Linux and other systems
+        subprocess.run(['xdg-open', path])
+
+
+class _SearchIndex:
+    """An index of the nodes of a tree by every substring of their lowercase root values.
+
+    Instance Attributes:
+    - nodes: every node of the tree in preorder
+    - parents: the position in nodes of the parent of each node, or -1 for the root of the tree
+    - first: maps every substring of every lowercase root value to the position in nodes of the first
+      node whose lowercase root value contains it
+
+    Representation Invariants:
+    - len(self.nodes) == len(self.parents)
+    """
+    nodes: list[Tree]
+    parents: list[int]
+    first: dict[str, int]
+    # Private Instance Attributes:
+    # - _freq, _subtrees, _num_subtrees: the frequency and subtrees list of the indexed tree when the index
+    #   was built, used to notice changes made without going through Tree's methods
+    # - _version: the version of the indexed tree when the index was built, used to notice insertions into
+    #   and merges with its subtrees
+    _freq: int
+    _subtrees: list[Tree]
+    _num_subtrees: int
+    _version: int
+
+    def __init__(self, tree: Tree) -> None:
+        """Initialize the search index of tree."""
+        self.nodes = []
+        self.parents = []
+        self._freq = tree.freq
+        self._subtrees = tree.subtrees
+        self._num_subtrees = len(tree.subtrees)
+        self._version = tree._version[0]
+
+        # Find the first node of every distinct lowercase root value in preorder
+        first_of_label = {}
+        stack = [(tree, -1)]
+        while stack:
+            node, parent = stack.pop()
+            position = len(self.nodes)
+            self.nodes.append(node)
+            self.parents.append(parent)
+            if node.root is not None:
+                first_of_label.setdefault(node.root.lower(), position)
+            stack.extend((subtree, position) for subtree in reversed(node.subtrees))
+
+        # Visit the distinct root values from the earliest first node, so every substring keeps the first
+        # node that contains it
+        self.first = {}
+        for label, position in sorted(first_of_label.items(), key=lambda item: item[1]):
+            self.first.setdefault('', position)
+            for start in range(len(label)):
+                for end in range(start + 1, len(label) + 1):
+                    self.first.setdefault(label[start:end], position)
+
+    def is_current(self, tree: Tree) -> bool:
+        """Return whether this index still describes tree, i.e. no node of tree has had data inserted or merged
+        into it since the index was built, and the root node of tree has not been changed directly.
+        """
+        return (tree._version[0] == self._version and tree.freq == self._freq
+                and tree.subtrees is self._subtrees and len(tree.subtrees) == self._num_subtrees)
+
+    def find(self, value: str) -> Optional[tuple[int, list[str]]]:
+        """Return the frequency of and the path to the first node whose root value contains value, ignoring case,
+        or None if there is no such node.
+        """
+        position = self.first.get(value.lower())
+        if position is None:
+            return None
+        freq = self.nodes[position].freq
+        path = []
+        while position != -1:
+            path.append(self.nodes[position].root)
+            position = self.parents[position]
+        path.reverse()
+        return freq, path
+
+
+def read_snapshot(data: bytes) -> tuple[list[str], array]:
+    """Return the table of root values and the nodes of the snapshot made by Tree.to_bytes.
+
+    The nodes are in preorder, three unsigned integers each: the index of the root value in the table, the
+    frequency and the number of subtrees. Raise a ValueError if data is not a valid snapshot.
+    """
+    if len(data) < _SNAPSHOT_HEADER.size:
+        raise ValueError('not a tree snapshot')
+    magic, num_labels, num_nodes = _SNAPSHOT_HEADER.unpack_from(data)
+    if magic != _SNAPSHOT_MAGIC:
+        raise ValueError('not a tree snapshot')
+    position = _SNAPSHOT_HEADER.size
+    lengths = array('I', data[position:position + 4 * num_labels])
+    position += 4 * num_labels
+    if sys.byteorder == 'big':
+        lengths.byteswap()
+    labels = []
+    for length in lengths:
+        labels.append(data[position:position + length].decode())
+        position += length
+    nodes = array('I', data[position:position + 12 * num_nodes])
+    if len(nodes) != 3 * num_nodes or num_nodes == 0:
+        raise ValueError('truncated tree snapshot')
+    if sys.byteorder == 'big':
+        nodes.byteswap()
+    # Every node but the root is a subtree of exactly one node, and every root value is in the table
+    if sum(nodes[2::3]) != num_nodes - 1 or max(nodes[0::3]) >= num_labels:
+        raise ValueError('malformed tree snapshot')
+    return labels, nodes
+
+
+def write_snapshot(labels: list[str], nodes: array) -> bytes:
+    """Return the snapshot with the given table of root values and nodes, in the format read by read_snapshot.
+
+    Preconditions:
+        - nodes.typecode == 'I' and len(nodes) % 3 == 0
+    """
+    lengths = array('I')
+    label_data = bytearray()
+    for label in labels:
+        encoded = label.encode()
+        lengths.append(len(encoded))
+        label_data += encoded
+    if sys.byteorder == 'big':
+        nodes = array('I', nodes)
+        nodes.byteswap()
+        lengths.byteswap()
+    header = _SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, len(lengths), len(nodes) // 3)
+    return header + lengths.tobytes() + bytes(label_data) + nodes.tobytes()
+
+
 if __name__ == '__main__':
     import doctest
     doctest.testmod(verbose=True)
@@ -0,0 +1,205 @@
+"""CSC111 Project 2: Occurrence Date Index
+
+This file indexes the rows of the crime dataset by occurrence date (OCC_YEAR, OCC_MONTH and OCC_DAY), so
+the rows of any date range, quarter or year to date are found by binary search instead of a scan of every row.
+The index is saved next to the column store cache of the csv file, so it is only built again when the csv
+file changes.
+"""
+from __future__ import annotations
+from array import array
+from typing import Any, BinaryIO, Optional
+import bisect
+import datetime
+import json
+import os
+from column_store import CACHE_DIR, ColumnStore, csv_fingerprint, load_store, write_cache_files
+from profiler import phase
+from normalize import column_rule
+
+_FORMAT_VERSION = 1
+_MONTH_NUMBERS = {datetime.date(2000, month, 1).strftime('%B').lower(): month for month in range(1, 13)}
+
+
+class DateIndex:
+    """The rows of a column store sorted by occurrence date.
+
+    Rows whose occurrence date is missing or invalid are left out of the index.
+
+    Instance Attributes:
+    - ordinals: the proleptic Gregorian ordinal (see datetime.date.toordinal) of the occurrence date of each
+      indexed row, in increasing order
+    - rows: the row id of each indexed row, in the same order as ordinals
+
+    Representation Invariants:
+    - len(self.ordinals) == len(self.rows)
+    - all(self.ordinals[i] <= self.ordinals[i + 1] for i in range(len(self.ordinals) - 1))
+    - rows with the same occurrence date are in increasing order of row id
+
+    >>> from column_store import encode_rows
+    >>> store = encode_rows(['OCC_YEAR', 'OCC_MONTH', 'OCC_DAY'],
+    ...                     [['2024', 'March', '5'], ['2023', 'June', '1'], ['', 'May', '2'], ['2024', 'March', '2']])
+    >>> index = build_date_index(store)
+    >>> list(index.rows)
+    [1, 3, 0]
+    >>> list(index.rows_between(datetime.date(2024, 1, 1), datetime.date(2024, 12, 31)))
+    [0, 3]
+    """
+    ordinals: array
+    rows: array
+
+    def __init__(self, ordinals: array, rows: array) -> None:
+        """Initialize a new date index from its sorted arrays."""
+        self.ordinals = ordinals
+        self.rows = rows
+
+    def rows_between(self, start: datetime.date, end: datetime.date) -> array:
+        """Return the ids of the rows that occurred from start to end (both included), in file order.
+
+        Only the matching rows are read, so the cost grows with the number of matching rows rather than
+        the size of the dataset.
+        """
+        low = bisect.bisect_left(self.ordinals, start.toordinal())
+        high = bisect.bisect_right(self.ordinals, end.toordinal())
+        return array('I', sorted(self.rows[low:high]))
+
+    def date_range(self) -> Optional[tuple[datetime.date, datetime.date]]:
+        """Return the earliest and latest occurrence dates of the indexed rows, or None if there are none."""
+        if not self.ordinals:
+            return None
+        return datetime.date.fromordinal(self.ordinals[0]), datetime.date.fromordinal(self.ordinals[-1])
+
+
+def build_date_index(store: ColumnStore) -> DateIndex:
+    """Return the date index of the rows of store.
+
+    Preconditions:
+        - 'OCC_YEAR', 'OCC_MONTH' and 'OCC_DAY' are stored in store
+    """
+    years = [_parse_int(label) for label in store.labels['OCC_YEAR']]
+    clean_month = column_rule('OCC_MONTH')
+    months = [_MONTH_NUMBERS.get(clean_month(label)) for label in store.labels['OCC_MONTH']]
+    days = [_parse_int(label) for label in store.labels['OCC_DAY']]
+
+    # Convert every distinct combination of codes to an ordinal only once
+    ordinal_of = {}
+    row_ordinals = []
+    for codes in zip(store.column('OCC_YEAR'), store.column('OCC_MONTH'), store.column('OCC_DAY')):
+        ordinal = ordinal_of.get(codes)
+        if ordinal is None:
+            ordinal = ordinal_of[codes] = _ordinal(years[codes[0]], months[codes[1]], days[codes[2]])
+        row_ordinals.append(ordinal)
+
+    rows = [row for row in range(store.num_rows) if row_ordinals[row] != 0]
+    # Sorting is stable, so rows of the same date stay in file order
+    rows.sort(key=row_ordinals.__getitem__)
+    return DateIndex(array('i', [row_ordinals[row] for row in rows]), array('I', rows))
+
+
+def load_date_index(csv_path: str) -> DateIndex:
+    """Return the date index of the csv file at csv_path, which is reused until the csv file changes.
+
+    The index is read from the cache directory of the column store if it was saved there for the current
+    contents of the csv file; otherwise it is built and saved.
+    """
+    store = load_store(csv_path)
+    key = os.path.abspath(csv_path)
+    if key not in _indexes or _indexes[key][0] is not store:
+        fingerprint = csv_fingerprint(csv_path)
+        meta_path, data_path = _cache_paths(csv_path)
+        with phase('date_index'):
+            index = _read_index(meta_path, data_path, fingerprint)
+            if index is None:
+                index = build_date_index(store)
+                _write_index(index, meta_path, data_path, fingerprint)
+        _indexes[key] = (store, index)
+    return _indexes[key][1]
+
+
+# The date index of each csv file, with the column store it was built from
+_indexes: dict[str, tuple[ColumnStore, DateIndex]] = {}
+
+
+def clear_date_indexes() -> None:
+    """Forget the date indexes built by this process."""
+    _indexes.clear()
+
+
+def _cache_paths(csv_path: str) -> tuple[str, str]:
+    """Return the paths of the metadata file and the data file of the saved date index of csv_path."""
+    name = os.path.basename(csv_path)
+    return os.path.join(CACHE_DIR, name + '.dates.json'), os.path.join(CACHE_DIR, name + '.dates.bin')
+
+
+def _write_index(index: DateIndex, meta_path: str, data_path: str, fingerprint: dict[str, int]) -> None:
+    """Save index to disk, replacing any previous one atomically."""
+    def write_data(data_file: BinaryIO) -> dict[str, Any]:
+        """Write the arrays of index to data_file and return the metadata describing them."""
+        index.ordinals.tofile(data_file)
+        index.rows.tofile(data_file)
+        return {'version': _FORMAT_VERSION, 'source': fingerprint, 'num_indexed': len(index.rows)}
+
+    write_cache_files(meta_path, data_path, write_data)
+
+
+def _read_index(meta_path: str, data_path: str, fingerprint: dict[str, int]) -> Optional[DateIndex]:
+    """Return the index saved at the given paths, or None if there is no valid index saved for fingerprint."""
+    try:
+        with open(meta_path, 'r') as meta_file:
+            meta = json.load(meta_file)
+        if meta.get('version') != _FORMAT_VERSION or meta.get('source') != fingerprint:
+            return None
+        ordinals, rows = array('i'), array('I')
+        with open(data_path, 'rb') as data_file:
+            ordinals.fromfile(data_file, meta['num_indexed'])
+            rows.fromfile(data_file, meta['num_indexed'])
+    except (OSError, ValueError, KeyError, EOFError):
+        return None
+    return DateIndex(ordinals, rows)
+
+
+def quarter(year: int, number: int) -> tuple[datetime.date, datetime.date]:
+    """Return the first and last dates of the given quarter of year.
+
+    Preconditions:
+        - 1 <= number <= 4
+
+    >>> quarter(2024, 1)
+    (datetime.date(2024, 1, 1), datetime.date(2024, 3, 31))
+    >>> quarter(2024, 4)
+    (datetime.date(2024, 10, 1), datetime.date(2024, 12, 31))
+    """
+    start = datetime.date(year, 3 * number - 2, 1)
+    end = datetime.date(year + 1, 1, 1) if number == 4 else datetime.date(year, 3 * number + 1, 1)
+    return start, end - datetime.timedelta(days=1)
+
+
+def year_to_date(through: datetime.date) -> tuple[datetime.date, datetime.date]:
+    """Return the first and last dates of the year to date ending on through.
+
+    >>> year_to_date(datetime.date(2024, 5, 17))
+    (datetime.date(2024, 1, 1), datetime.date(2024, 5, 17))
+    """
+    return datetime.date(through.year, 1, 1), through
+
+
+def _parse_int(label: str) -> Optional[int]:
+    """Return label as an integer, or None if it is not one (e.g. a missing value)."""
+    try:
+        return int(float(label))
+    except (ValueError, OverflowError):
+        return None
+
+
+def _ordinal(year: Optional[int], month: Optional[int], day: Optional[int]) -> int:
+    """Return the ordinal of the given date, or 0 if it is missing or invalid."""
+    if year is None or month is None or day is None:
+        return 0
+    try:
+        return datetime.date(year, month, day).toordinal()
+    except ValueError:
+        return 0
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,170 @@
+"""CSC111 Project 2: External Path Aggregation
+
+This file counts the distinct paths of a stream of rows within a memory budget. At most max_paths distinct
+paths are counted in memory at a time; whenever the budget is exceeded, the partial counts are sorted and
+spilled to a run file on disk, and the run files are merged back at the end. Paths come out in order of their
+first occurrence in the stream, so a tree built from them is identical to one built row by row, and a build
+with many distinct paths slows down instead of running out of memory.
+"""
+from __future__ import annotations
+from array import array
+from typing import Iterable, Iterator, Optional
+import contextlib
+import heapq
+import os
+import tempfile
+from column_store import CACHE_DIR
+from profiler import phase
+
+SPILL_DIR = os.path.join(CACHE_DIR, 'spill')
+# Default number of distinct paths counted in memory before spilling to disk
+SPILL_PATHS = 250_000
+# Maximum number of run files merged at once; more runs are merged in several passes
+MERGE_FAN_IN = 64
+# Number of records read from a run file at a time
+_READ_RECORDS = 4096
+
+
+def aggregate_paths(paths: Iterable[tuple[int, ...]], width: int, max_paths: int = SPILL_PATHS,
+                    spill_dir: Optional[str] = SPILL_DIR) -> Iterator[tuple[tuple[int, ...], int]]:
+    """Yield every distinct path of paths with its number of occurrences, in order of first occurrence.
+
+    If there are more than max_paths distinct paths, partial counts are spilled to run files in a temporary
+    directory inside spill_dir (or the system's temporary directory if spill_dir is None), which is created
+    when the first run is spilled and removed once every path has been yielded. Otherwise nothing is written
+    to disk.
+
+    Preconditions:
+        - width >= 1 and every path has width non-negative codes below 2 ** 32
+        - max_paths >= 1
+
+    >>> rows = [(1, 0), (0, 2), (1, 0), (2, 2), (0, 2), (1, 1), (1, 0)]
+    >>> list(aggregate_paths(rows, 2)) == list(aggregate_paths(rows, 2, max_paths=1))
+    True
+    >>> list(aggregate_paths(rows, 2, max_paths=1))
+    [((1, 0), 3), ((0, 2), 2), ((2, 2), 1), ((1, 1), 1)]
+    """
+    counts = {}
+    runs = []
+    directory = None
+    with contextlib.ExitStack() as stack:
+        # Count each path with the position of its first occurrence, spilling runs sorted by path
+        for position, path in enumerate(paths):
+            entry = counts.get(path)
+            if entry is not None:
+                entry[0] += 1
+                continue
+            if len(counts) >= max_paths:
+                if directory is None:
+                    directory = stack.enter_context(tempfile.TemporaryDirectory(dir=_spill_directory(spill_dir)))
+                runs.append(_spill(directory, counts))
+            counts[path] = [1, position]
+
+        if not runs:
+            # Everything fit in memory, and dictionaries keep the order of first occurrence
+            for path, (count, _) in counts.items():
+                yield path, count
+            return
+
+        runs.append(_spill(directory, counts))
+
+        # Add up the counts of each path across the runs, then sort the totals by first occurrence in runs of
+        # at most max_paths records, as (first position, count, path...)
+        with phase('merge_runs'):
+            by_position = []
+            totals = []
+            for record in _combine(_merge(directory, runs, width + 2)):
+                totals.append((record[-1], record[-2]) + record[:-2])
+                if len(totals) >= max_paths:
+                    totals.sort()
+                    by_position.append(_write_run(directory, totals))
+                    totals.clear()
+            totals.sort()
+            by_position.append(_write_run(directory, totals))
+            del totals
+
+        for record in _merge(directory, by_position, width + 2):
+            yield record[2:], record[1]
+
+
+def _spill_directory(spill_dir: Optional[str]) -> Optional[str]:
+    """Return spill_dir after creating it if needed."""
+    if spill_dir is not None:
+        os.makedirs(spill_dir, exist_ok=True)
+    return spill_dir
+
+
+def _spill(directory: str, counts: dict[tuple[int, ...], list[int]]) -> str:
+    """Write the records (path..., count, first position) of counts sorted by path to a new run file in directory,
+    empty counts and return the path of the run file.
+    """
+    with phase('spill'):
+        run = _write_run(directory, (path + tuple(entry) for path, entry in sorted(counts.items())))
+    counts.clear()
+    return run
+
+
+def _write_run(directory: str, records: Iterable[tuple[int, ...]]) -> str:
+    """Write records to a new run file in directory and return its path."""
+    descriptor, path = tempfile.mkstemp(suffix='.run', dir=directory)
+    with os.fdopen(descriptor, 'wb') as run_file:
+        block = array('I')
+        for record in records:
+            block.extend(record)
+            if len(block) >= _READ_RECORDS * len(record):
+                block.tofile(run_file)
+                del block[:]
+        block.tofile(run_file)
+    return path
+
+
+def _read_run(path: str, width: int) -> Iterator[tuple[int, ...]]:
+    """Yield the records of width codes of the run file at path, then remove the file."""
+    try:
+        with open(path, 'rb') as run_file:
+            while True:
+                block = array('I')
+                block.frombytes(run_file.read(_READ_RECORDS * width * block.itemsize))
+                if not block:
+                    break
+                yield from zip(*[iter(block)] * width)
+    finally:
+        # The run may already be gone if the merge was abandoned and its directory removed
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def _merge(directory: str, runs: list[str], width: int) -> Iterator[tuple[int, ...]]:
+    """Yield the records of the sorted run files runs in sorted order, consuming the run files.
+
+    At most MERGE_FAN_IN runs are open at a time: if there are more, groups of them are first merged into
+    longer runs in directory.
+    """
+    while len(runs) > MERGE_FAN_IN:
+        runs = [_write_run(directory, heapq.merge(*[_read_run(run, width) for run in runs[i:i + MERGE_FAN_IN]]))
+                for i in range(0, len(runs), MERGE_FAN_IN)]
+    return heapq.merge(*[_read_run(run, width) for run in runs])
+
+
+def _combine(records: Iterator[tuple[int, ...]]) -> Iterator[tuple[int, ...]]:
+    """Combine the consecutive records (path..., count, first position) of equal paths into one record, adding
+    up their counts and keeping their earliest position.
+
+    >>> list(_combine(iter([(0, 1, 4), (0, 2, 1), (3, 1, 0)])))
+    [(0, 3, 1), (3, 1, 0)]
+    """
+    current = None
+    for record in records:
+        if current is not None and record[:-2] == current[:-2]:
+            current = current[:-2] + (current[-2] + record[-2], min(current[-1], record[-1]))
+        else:
+            if current is not None:
+                yield current
+            current = record
+    if current is not None:
+        yield current
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -3,6 +3,7 @@
 This file includes functions for input validation, custom column selection for analysis,
 ranking display and output styling."""
 
+from concurrent.futures import Future
 from typing import Any
 import time
 
@@ -105,5 +106,13 @@ def display_rankings(rankings: dict[int, tuple[str, int]], name: str = None) ->
             tw_print(col_g(f"{{{key}}} {value[0]}: {value[1]}"))
 
 
+def report_visualization(future: Future) -> None:
+    """Tell the user if rendering the tree visualization in the background failed."""
+    error = future.exception()
+    if error is not None:
+        # Printed in one piece, since this runs on the rendering thread while the menus may be printing
+        print(col_r(f"\nTree Visualization could not be rendered: {error}"))
+
+
 if __name__ == '__main__':
     pass
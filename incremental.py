@@ -0,0 +1,107 @@
+"""CSC111 Project 2: Incremental Data Ingestion
+
+This file keeps full and cropped crime trees up to date while new rows are appended to the csv file.
+Only the bytes added since the last refresh are parsed, and only the branches of the cropped trees
+that received new rows are cropped again.
+"""
+from __future__ import annotations
+import csv
+import os
+from crime_tree import Tree
+from render_data import CSV_PATH, crop_levels, crop_tree, read_rows, refresh_crop
+from normalize import RowNormalizer
+
+
+class IncrementalTrees:
+    """A set of full and cropped trees that follow the rows appended to a csv file.
+
+    Instance Attributes:
+    - csv_path: path of the csv file being followed
+    - offset: byte offset just past the last complete line of the csv file that has been consumed
+
+    Representation Invariants:
+    - every tracked full tree holds exactly the rows of its month found in the first self.offset bytes
+      of the csv file
+    """
+    csv_path: str
+    offset: int
+    # Private Instance Attributes:
+    # - _titles: the title row of the csv file
+    # - _data_start: byte offset of the first data row
+    # - _trees: maps each tracked (month, columns) to its (full tree, cropped tree)
+    # - _normalizers: maps each tracked (month, columns) to the normalizer of its rows
+    _titles: list[str]
+    _data_start: int
+    _trees: dict[tuple[str, tuple[str, ...]], tuple[Tree, Tree]]
+    _normalizers: dict[tuple[str, tuple[str, ...]], RowNormalizer]
+
+    def __init__(self, csv_path: str = CSV_PATH) -> None:
+        """Initialize a new set of tracked trees following the csv file at csv_path, with nothing consumed yet."""
+        self.csv_path = csv_path
+        with open(csv_path, 'rb') as csv_file:
+            self._titles = next(csv.reader([csv_file.readline().decode()]))
+            self._data_start = csv_file.tell()
+        self.offset = self._data_start
+        self._trees = {}
+        self._normalizers = {}
+
+    def track(self, month: str, columns: list[str]) -> tuple[Tree, Tree]:
+        """Return the full and cropped trees of the given month and hierarchy, and keep them up to date
+        from now on.
+
+        The returned trees include every complete row currently in the csv file.
+
+        Preconditions:
+            - len(columns) > 0
+        """
+        key = (month.lower(), tuple(columns))
+        if key not in self._trees:
+            # Build the new trees from the rows that have already been consumed for the other trees
+            full_tree = Tree(f'{month.title()} Crimes in Toronto', 0, [])
+            normalizer = RowNormalizer(self._titles, columns)
+            for row in read_rows(self.csv_path, self._data_start, self.offset):
+                if row and normalizer.month(row) == key[0]:
+                    full_tree.insert_path(normalizer.path(row))
+            cropped_tree = Tree(f'{month.title()} High Frequency Crimes in Toronto', full_tree.freq, [])
+            crop_tree(full_tree, cropped_tree, crop_levels(len(columns)))
+            self._trees[key] = (full_tree, cropped_tree)
+            self._normalizers[key] = normalizer
+        self.refresh()
+        return self._trees[key]
+
+    def refresh(self) -> int:
+        """Insert the rows appended to the csv file since the last refresh into every tracked tree and return
+        how many rows were consumed.
+
+        A trailing line without a line break is left for the next refresh, since it may still be being written.
+        Raise a ValueError if the csv file is now shorter than what has already been consumed.
+        """
+        if os.path.getsize(self.csv_path) < self.offset:
+            raise ValueError(f'{self.csv_path} was truncated; build the trees again')
+        with open(self.csv_path, 'rb') as csv_file:
+            csv_file.seek(self.offset)
+            appended = csv_file.read()
+        end = appended.rfind(b'\n') + 1
+        if end == 0:
+            return 0
+        rows = [row for row in csv.reader(appended[:end].decode().splitlines()) if row]
+        self.offset += end
+
+        for (month, columns), (full_tree, cropped_tree) in self._trees.items():
+            normalizer = self._normalizers[(month, columns)]
+            # Record the categories on every path that receives a new row
+            touched = {}
+            for row in rows:
+                if normalizer.month(row) == month:
+                    path = normalizer.path(row)
+                    full_tree.insert_path(path)
+                    node = touched
+                    for cat in path:
+                        node = node.setdefault(cat, {})
+            if touched:
+                refresh_crop(full_tree, cropped_tree, crop_levels(len(columns)), touched)
+        return len(rows)
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,127 @@
+"""CSC111 Project 2: Lazy Crime Tree
+
+This file provides a crime tree that builds its levels only when they are visited. Each node that has not
+been expanded yet keeps the ids of its rows in the column store instead of its subtrees, and its subtrees are
+built from those rows the first time anything (a query, the printer or the visualization) reads them. For deep
+hierarchies, where only a few branches are usually looked at, most of the tree is never built.
+"""
+from __future__ import annotations
+from array import array
+from typing import Any, Optional
+from crime_tree import Tree
+from column_store import ColumnStore
+
+
+class LazyTree(Tree):
+    """A crime tree whose subtrees are built from its rows when first read.
+
+    A LazyTree behaves exactly like the Tree built by inserting the same rows one at a time, including the
+    order of the subtrees. Reading self.subtrees is what expands a node, so every Tree method works unchanged.
+
+    Representation Invariants:
+    - self.freq == number of rows of the node, until the tree is changed through Tree's building methods
+
+    >>> from column_store import encode_rows
+    >>> titles = ['MCI_CATEGORY', 'OCC_HOUR', 'NEIGHBOURHOOD_158']
+    >>> rows = [['Assault', '3', 'Annex (95)'], ['Robbery', '12', 'Annex (95)'], ['Assault', '20', 'West Hill (136)'],
+    ...         ['Assault', '15', 'Annex (95)']]
+    >>> store = encode_rows(titles, rows)
+    >>> tables = [['Assault', 'Robbery'], ['Night', 'Day', 'Night', 'Day'], ['Annex', 'West Hill']]
+    >>> tree = LazyTree('Root', 4, store, titles, tables, array('I', range(4)))
+    >>> tree.expanded
+    False
+    >>> tree.top_rankings(1, 2)
+    {1: ('Assault', 3), 2: ('Robbery', 1)}
+    >>> tree.expanded, [subtree.expanded for subtree in tree.subtrees]
+    (True, [False, False])
+    >>> print(tree, end='')
+    Root (4)
+      Assault (3)
+        Night (2)
+          Annex (1)
+          West Hill (1)
+        Day (1)
+          Annex (1)
+      Robbery (1)
+        Day (1)
+          Annex (1)
+    """
+    __slots__ = ('_store', '_columns', '_tables', '_rows', '_depth')
+    # Private Instance Attributes:
+    # - _store: the column store holding the rows of the tree
+    # - _columns: the hierarchy of the whole tree, as stored column names
+    # - _tables: the cleaned category of every code of each column of the hierarchy
+    # - _rows: the ids of the rows of this node in file order, or None once the node has been expanded
+    # - _depth: the position in _columns of the column the subtrees of this node are grouped by
+    _store: ColumnStore
+    _columns: list[str]
+    _tables: list[list[str]]
+    _rows: Optional[array]
+    _depth: int
+
+    def __init__(self, root: Any, freq: int, store: ColumnStore, columns: list[str], tables: list[list[str]],
+                 rows: array, depth: int = 0) -> None:
+        """Initialize a new unexpanded tree of the given rows of store, whose subtrees are grouped by
+        columns[depth] and so on down the hierarchy.
+
+        Preconditions:
+            - freq == len(rows)
+            - 0 <= depth <= len(columns)
+            - len(tables) == len(columns)
+            - rows is in increasing order
+        """
+        super().__init__(root, freq, [])
+        self._store = store
+        self._columns = columns
+        self._tables = tables
+        self._rows = rows
+        self._depth = depth
+
+    @property
+    def subtrees(self) -> list[Tree]:
+        """The subtrees of this node, which are built the first time they are read."""
+        if self._rows is not None:
+            self._expand()
+        return Tree.subtrees.__get__(self)
+
+    @subtrees.setter
+    def subtrees(self, subtrees: list[Tree]) -> None:
+        """Replace the subtrees of this node, which no longer need to be built."""
+        Tree.subtrees.__set__(self, subtrees)
+        self._rows = None
+
+    @property
+    def expanded(self) -> bool:
+        """Whether the subtrees of this node have been built."""
+        return self._rows is None
+
+    def _expand(self) -> None:
+        """Build the subtrees of this node from its rows, in order of first occurrence of their categories."""
+        rows = self._rows
+        subtrees = []
+        if self._depth < len(self._columns):
+            codes = self._store.column(self._columns[self._depth])
+            table = self._tables[self._depth]
+            if self._depth == len(self._columns) - 1:
+                # The subtrees are leaves, so only their frequencies are needed
+                counts = {}
+                for row in rows:
+                    label = table[codes[row]]
+                    counts[label] = counts.get(label, 0) + 1
+                subtrees = [Tree(label, count, []) for label, count in counts.items()]
+            else:
+                groups = {}
+                for row in rows:
+                    label = table[codes[row]]
+                    group = groups.get(label)
+                    if group is None:
+                        group = groups[label] = array('I')
+                    group.append(row)
+                subtrees = [LazyTree(label, len(group), self._store, self._columns, self._tables, group,
+                                     self._depth + 1) for label, group in groups.items()]
+        self.subtrees = subtrees
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
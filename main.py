@@ -1,11 +1,24 @@
-"""CSC111 Project 2: Main"""
+"""CSC111 Project 2: Main
 
+Run with --profile to record how long each phase of building, cropping, drawing and querying the trees takes
+(see profiler.py), optionally followed by the path of the report to write.
+"""
+
+import argparse
+import profiler
 import render_data as rd
-from helper_functions import validate_choice, get_custom_tree_columns, tw_print, begin_msg, col_r, col_y
+from helper_functions import validate_choice, get_custom_tree_columns, tw_print, begin_msg, col_r, col_y, \
+    report_visualization
 from data_tools import data_analysis_tools
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Analyze the crimes of a month in Toronto as decision trees.')
+    parser.add_argument('--profile', nargs='?', const=profiler.DEFAULT_REPORT, metavar='REPORT',
+                        help=f'record the time and memory of every phase (report: {profiler.DEFAULT_REPORT})')
+    arguments = parser.parse_args()
+    if arguments.profile is not None:
+        profiler.enable(arguments.profile)
     begin_msg()
 
     months = ["january", "february", "march", "april", "may", "june", "july", "august", "september",
@@ -39,19 +52,13 @@ if __name__ == '__main__':
         valid_input = list(menu_options.keys())
         choice = validate_choice(col_r("\nEnter which hierarchical analysis you want to do: "), valid_input)
 
-        analysis_options = {
-            1: ['NEIGHBOURHOOD_158', 'MCI_CATEGORY', 'PREMISES_TYPE'],
-            2: ['OCC_HOUR', 'MCI_CATEGORY', 'NEIGHBOURHOOD_158'],
-            3: ['MCI_CATEGORY', 'NEIGHBOURHOOD_158', 'PREMISES_TYPE'],
-            4: ['PREMISES_TYPE', 'MCI_CATEGORY', 'NEIGHBOURHOOD_158']
-        }
-
-        if choice in analysis_options:
-            columns = analysis_options[choice]
+        if choice in rd.ANALYSIS_OPTIONS:
+            columns = rd.ANALYSIS_OPTIONS[choice]
         else:
             columns = get_custom_tree_columns()
 
         full_tree, cropped_tree = rd.build_crime_tree(month, columns)
-        cropped_tree.visualize()
-        tw_print("\n\n==================\nTree Visualization has opened in your browser.\n==================")
+        cropped_tree.visualize().add_done_callback(report_visualization)
+        tw_print("\n\n==================\nTree Visualization will open in your browser once it is rendered.\n"
+                 "==================")
         data_analysis_tools(full_tree, columns, choice)
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""CSC111 Project 2: Label Normalization
+
+This file turns the raw values of the crime dataset into the categories used in the trees. Each column has a
+cleaning rule, configured in COLUMN_RULES, and each distinct raw value is cleaned only once: the cleaned values
+are kept in a LabelTable per column, so cleaning a cell during ingest is a single dictionary lookup, and equal
+categories share one interned string.
+"""
+from __future__ import annotations
+from typing import Callable, Optional
+import sys
+
+
+def clean_label(value: str) -> str:
+    """Return value without a trailing bracketed id, as used by the neighbourhood names in the dataset.
+
+    >>> clean_label('Yonge-Bay Corridor (170)')
+    'Yonge-Bay Corridor'
+    >>> clean_label('Theft Over')
+    'Theft Over'
+    >>> clean_label('')
+    ''
+    """
+    if value.endswith(')'):
+        loc_name = value.split()
+        loc_name.pop()
+        return ' '.join(loc_name)
+    return value
+
+
+def day_or_night(hour: str) -> str:
+    """Return whether the given hour of the day is in the day (from 6 until 18) or the night.
+
+    >>> day_or_night('6'), day_or_night('17'), day_or_night('18')
+    ('Day', 'Day', 'Night')
+    """
+    return 'Day' if 6 <= int(hour) < 18 else 'Night'
+
+
+# The cleaning rule of each column; columns not listed here use DEFAULT_RULE
+COLUMN_RULES: dict[str, Callable[[str], str]] = {
+    'NEIGHBOURHOOD_158': clean_label,
+    'OCC_HOUR': day_or_night,
+    'OCC_MONTH': str.lower
+}
+DEFAULT_RULE = clean_label
+
+
+def column_rule(column: str, rules: Optional[dict[str, Callable[[str], str]]] = None) -> Callable[[str], str]:
+    """Return the cleaning rule of column in rules (or COLUMN_RULES if rules is None)."""
+    return (COLUMN_RULES if rules is None else rules).get(column, DEFAULT_RULE)
+
+
+class LabelTable(dict):
+    """The cleaned value of every raw value of a column seen so far.
+
+    Looking up a raw value that has not been seen yet cleans it with the table's rule and remembers the
+    interned result.
+
+    Instance Attributes:
+    - rule: the cleaning rule of the column
+
+    >>> table = LabelTable(day_or_night)
+    >>> table['3'], table['14'], table['3']
+    ('Night', 'Day', 'Night')
+    >>> len(table)
+    2
+    """
+    rule: Callable[[str], str]
+
+    def __init__(self, rule: Callable[[str], str]) -> None:
+        """Initialize a new, empty table cleaning values with rule."""
+        super().__init__()
+        self.rule = rule
+
+    def __missing__(self, raw: str) -> str:
+        """Clean raw, remember the result and return it."""
+        label = self[raw] = sys.intern(self.rule(raw))
+        return label
+
+
+class CodeTable(dict):
+    """The cleaned value of every code of a column of a column store looked up so far.
+
+    Codes are cleaned with the table's rule the first time they are looked up, so the values of codes that are
+    never looked up (e.g. those only used by the rows of other months) are never cleaned.
+
+    Instance Attributes:
+    - labels: the raw value of every code of the column
+    - rule: the cleaning rule of the column
+
+    >>> table = CodeTable(['3', '', '14'], day_or_night)
+    >>> table[2], table[0]
+    ('Day', 'Night')
+    >>> sorted(table)
+    [0, 2]
+    """
+    labels: list[str]
+    rule: Callable[[str], str]
+
+    def __init__(self, labels: list[str], rule: Callable[[str], str]) -> None:
+        """Initialize a new, empty table cleaning the values of labels with rule."""
+        super().__init__()
+        self.labels = labels
+        self.rule = rule
+
+    def __missing__(self, code: int) -> str:
+        """Clean the value of code, remember the result and return it."""
+        label = self[code] = sys.intern(self.rule(self.labels[code]))
+        return label
+
+
+class RowNormalizer:
+    """Cleans the cells of the rows of a csv file that make up the path of a row in a tree of the given hierarchy.
+
+    Instance Attributes:
+    - columns: the hierarchy, as names of columns of the csv file
+
+    >>> normalizer = RowNormalizer(['MCI_CATEGORY', 'OCC_HOUR', 'NEIGHBOURHOOD_158', 'OCC_MONTH'],
+    ...                            ['NEIGHBOURHOOD_158', 'OCC_HOUR', 'MCI_CATEGORY'])
+    >>> row = ['Assault', '19', 'Annex (95)', 'May']
+    >>> normalizer.path(row), normalizer.month(row)
+    (['Annex', 'Night', 'Assault'], 'may')
+    """
+    columns: list[str]
+    # Private Instance Attributes:
+    # - _cells: the index in a row and the label table of every column of the hierarchy, in order
+    # - _month_cell: the index in a row and the label table of the month column
+    _cells: list[tuple[int, LabelTable]]
+    _month_cell: tuple[int, LabelTable]
+
+    def __init__(self, titles: list[str], columns: list[str],
+                 rules: Optional[dict[str, Callable[[str], str]]] = None) -> None:
+        """Initialize a new normalizer of rows with the given title row, using the cleaning rules in rules
+        (or COLUMN_RULES if rules is None).
+
+        Preconditions:
+            - all(column in titles for column in columns)
+            - 'OCC_MONTH' in titles
+        """
+        self.columns = columns
+        self._cells = [(titles.index(column), LabelTable(column_rule(column, rules))) for column in columns]
+        self._month_cell = (titles.index('OCC_MONTH'), LabelTable(column_rule('OCC_MONTH', rules)))
+
+    def path(self, row: list[str]) -> list[str]:
+        """Return the cleaned categories of row in the columns of the hierarchy."""
+        return [table[row[index]] for index, table in self._cells]
+
+    def month(self, row: list[str]) -> str:
+        """Return the cleaned month of row."""
+        index, table = self._month_cell
+        return table[row[index]]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
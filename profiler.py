@@ -0,0 +1,187 @@
+"""CSC111 Project 2: Profiling
+
+This file provides opt-in instrumentation of the phases of building, cropping, drawing and querying crime trees.
+For every phase it records the number of calls, the wall time and the peak memory traced by tracemalloc, and
+writes them as a JSON report when the program exits. Peak memory is only measured for phases running on the
+main thread, since tracemalloc keeps a single peak for the whole process; the peak of phases that only ran on
+other threads, such as drawing visualizations in the background, is reported as null.
+
+Profiling is turned on by setting the CRIME_PROFILE environment variable to any value other than an empty
+string, 0 or false, or by running main.py with --profile. The report is written to the path in the
+CRIME_PROFILE_REPORT environment variable, the path given to --profile, or DEFAULT_REPORT. While profiling is
+off, an instrumented phase costs a single check of a global flag.
+
+The phases recorded are csv_parse and column_store_load (reading the data), month_filter (splitting it by month
+into count cubes), insert (deriving a full tree from a cube), snapshot_load and snapshot_save, crop_tree,
+parallel_build, add_nodes and dot_render (drawing a visualization), build_crime_tree as a whole, and one
+query.<name> phase per analysis query of Tree.
+"""
+from __future__ import annotations
+from typing import Any, Callable, Optional, TypeVar
+import atexit
+import datetime
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+ENV_VAR = 'CRIME_PROFILE'
+REPORT_ENV_VAR = 'CRIME_PROFILE_REPORT'
+# Values of ENV_VAR that leave profiling off, compared in lowercase
+_OFF_VALUES = {'', '0', 'false'}
+DEFAULT_REPORT = 'profile_report.json'
+
+_enabled = False
+_report_path = DEFAULT_REPORT
+# Maps each phase name to [calls, total seconds, longest call in seconds, peak bytes above the starting level],
+# where the peak is None if no call of the phase was on the main thread
+_stats: dict[str, list] = {}
+_stats_lock = threading.Lock()
+# The phases currently running on each thread, innermost last
+_running = threading.local()
+
+_F = TypeVar('_F', bound=Callable[..., Any])
+
+
+def enable(report_path: Optional[str] = None) -> None:
+    """Start profiling, and write the report to report_path (or DEFAULT_REPORT) when the program exits."""
+    global _enabled, _report_path
+    if report_path is not None:
+        _report_path = report_path
+    if not _enabled:
+        _enabled = True
+        tracemalloc.start()
+        atexit.register(write_report)
+
+
+def is_enabled() -> bool:
+    """Return whether profiling is turned on."""
+    return _enabled
+
+
+def phase(name: str) -> Any:
+    """Return a context manager recording the code it runs as one call of the phase called name.
+
+    While profiling is off, the returned context manager does nothing.
+    """
+    if not _enabled:
+        return _NO_PHASE
+    return _Phase(name)
+
+
+def profiled(name: str) -> Callable[[_F], _F]:
+    """Return a decorator recording every call of the decorated function as one call of the phase called name."""
+    def decorator(function: _F) -> _F:
+        """Wrap function so its calls are recorded while profiling is on."""
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            """Call the wrapped function, as a phase if profiling is on."""
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Phase(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def report() -> dict[str, Any]:
+    """Return the statistics recorded so far, with the phases that took the most total time first."""
+    with _stats_lock:
+        items = sorted(_stats.items(), key=lambda item: item[1][1], reverse=True)
+    phases = {}
+    for name, (calls, total, longest, peak) in items:
+        phases[name] = {'calls': calls, 'total_seconds': total, 'mean_seconds': total / calls,
+                        'max_seconds': longest, 'peak_bytes': peak}
+    return {'created': datetime.datetime.now().isoformat(timespec='seconds'), 'phases': phases}
+
+
+def write_report() -> None:
+    """Write the statistics recorded so far to the report file."""
+    with open(_report_path, 'w') as report_file:
+        json.dump(report(), report_file, indent=2)
+    print(f'Profiling report written to {_report_path}', file=sys.stderr)
+
+
+class _NoPhase:
+    """A context manager that does nothing, used for phases while profiling is off."""
+
+    def __enter__(self) -> None:
+        """Do nothing."""
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Do nothing."""
+
+
+_NO_PHASE = _NoPhase()
+
+
+class _Phase:
+    """A context manager recording one call of a phase.
+
+    Instance Attributes:
+    - name: name of the phase
+    - start: value of time.perf_counter() when the call started
+    - start_bytes: traced memory when the call started
+    - peak: highest traced memory seen during the call so far, including by the phases nested in it
+    - measured: whether the peak memory of the call is measured, which is only the case on the main thread
+    """
+    name: str
+    start: float
+    start_bytes: int
+    peak: int
+    measured: bool
+
+    def __init__(self, name: str) -> None:
+        """Initialize a new call of the phase called name."""
+        self.name = name
+        self.start = 0.0
+        self.start_bytes = 0
+        self.peak = 0
+        self.measured = False
+
+    def __enter__(self) -> None:
+        """Start timing the call and, on the main thread, tracing its peak memory."""
+        # The traced peak is shared by every thread, so only the main thread resets and reads it
+        self.measured = threading.current_thread() is threading.main_thread()
+        if self.measured:
+            stack = getattr(_running, 'stack', None)
+            if stack is None:
+                stack = _running.stack = []
+            current, peak = tracemalloc.get_traced_memory()
+            # Resetting the peak hides it from the enclosing phase, so hand it over first
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, peak)
+            tracemalloc.reset_peak()
+            self.start_bytes = current
+            self.peak = current
+            stack.append(self)
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Record the call."""
+        elapsed = time.perf_counter() - self.start
+        if self.measured:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            stack = _running.stack
+            stack.pop()
+            if stack:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+        with _stats_lock:
+            stats = _stats.setdefault(self.name, [0, 0.0, 0.0, None])
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+            if self.measured:
+                stats[3] = max(stats[3] or 0, self.peak - self.start_bytes)
+
+
+def _env_enabled() -> bool:
+    """Return whether the CRIME_PROFILE environment variable turns profiling on."""
+    return os.environ.get(ENV_VAR, '').strip().lower() not in _OFF_VALUES
+
+
+if _env_enabled():
+    enable(os.environ.get(REPORT_ENV_VAR) or None)
@@ -5,8 +5,44 @@ It includes functionality to construct a full crime tree from a dataset and gene
 a cropped tree focusing on high-frequency crimes based on user-defined criteria.
 """
 from __future__ import annotations
+from array import array
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress
+from typing import Iterator, Optional
 import csv
+import datetime
+import os
 from crime_tree import Tree
+from column_store import ColumnStore, clear_loaded_stores, csv_fingerprint, load_store
+from snapshot_store import load_snapshot, save_snapshot
+from profiler import phase, profiled
+from normalize import CodeTable, RowNormalizer, column_rule
+from date_index import clear_date_indexes, load_date_index
+from lazy_tree import LazyTree
+from external_aggregate import aggregate_paths
+from spatial_index import GridIndex, clear_grid_indexes, load_grid_index
+
+CSV_PATH = '2024_major_crime_indicators.csv'
+MONTHS = ['january', 'february', 'march', 'april', 'may', 'june', 'july', 'august', 'september',
+          'october', 'november', 'december']
+
+# Every column a tree can be built from, in the order they are kept in a CountCube
+CUBE_COLUMNS = ['OCC_DAY', 'OCC_DOW', 'OCC_HOUR', 'DIVISION', 'LOCATION_TYPE', 'PREMISES_TYPE', 'OFFENCE',
+                'MCI_CATEGORY', 'NEIGHBOURHOOD_158']
+
+# The hierarchies of the preset analyses offered by the main menu, keyed by menu number
+ANALYSIS_OPTIONS = {
+    1: ['NEIGHBOURHOOD_158', 'MCI_CATEGORY', 'PREMISES_TYPE'],
+    2: ['OCC_HOUR', 'MCI_CATEGORY', 'NEIGHBOURHOOD_158'],
+    3: ['MCI_CATEGORY', 'NEIGHBOURHOOD_158', 'PREMISES_TYPE'],
+    4: ['PREMISES_TYPE', 'MCI_CATEGORY', 'NEIGHBOURHOOD_158']
+}
+
+# Maximum number of (month, columns) entries kept in the tree cache
+TREE_CACHE_SIZE = 48
+# The trees of each (month or period, columns, csv path), with the fingerprint of the csv file they were built from
+_tree_cache: OrderedDict[tuple[str, tuple[str, ...], str], tuple[dict[str, int], tuple[Tree, Tree]]] = OrderedDict()
 
 
 def crop_tree(full_tree: Tree, cropped_tree: Tree, highs: list) -> None:
@@ -16,76 +52,588 @@ def crop_tree(full_tree: Tree, cropped_tree: Tree, highs: list) -> None:
         - full_tree.root is not None and cropped_tree.root is not None
         - full_tree.freq >= 0 and cropped_tree.freq >= 0
     """
-    # Create a copy of the list of the subtrees of the full tree
-    copy_full_subtrees = full_tree.subtrees.copy()
     # Find the top required amount of maximum frequencies in this depth
-    for _ in range(highs[0]):
-        # Find a maximum in this copy of the full tree's subtrees list
-        max_freq = 0
-        subtree = None
-        for i in range(len(copy_full_subtrees)):
-            if copy_full_subtrees[i].freq >= max_freq:
-                subtree = copy_full_subtrees[i]
-                max_freq = copy_full_subtrees[i].freq
-        # If found a maximum
-        if subtree is not None:
-            # Remove it from this copy of the full tree's subtrees list
-            copy_full_subtrees.remove(subtree)
-            # Create a new subtree for cropped tree exactly similar to the maximum frequncy crime
+    for subtree in full_tree.top_subtrees(highs[0], later_first=True):
+        # Create a new subtree for cropped tree exactly similar to the maximum frequncy crime
+        new_tree = Tree(subtree.root, subtree.freq, [])
+        # If there are other categories in the original crime data, recurse through them
+        if len(highs) > 1:
+            crop_tree(subtree, new_tree, highs[1:])
+        # Add this new complete subtree to the cropped tree
+        cropped_tree.subtrees.append(new_tree)
+
+
+def refresh_crop(full_tree: Tree, cropped_tree: Tree, highs: list, touched: dict) -> None:
+    """Update the cropped tree, previously made from full_tree by crop_tree with the same highs, after new
+    data was inserted into full_tree.
+
+    touched is a nested dictionary of the categories on the paths that received new data
+    (e.g. {'Theft': {'Day': {}}}). Cropped subtrees of untouched categories are kept as they are
+    instead of being cropped again.
+
+    Preconditions:
+        - full_tree.root is not None and cropped_tree.root is not None
+        - cropped_tree was made by crop_tree(full_tree, cropped_tree, highs) before the new data was inserted
+    """
+    cropped_tree.freq = full_tree.freq
+    old_subtrees = {subtree.root: subtree for subtree in cropped_tree.subtrees}
+    new_subtrees = []
+    for subtree in full_tree.top_subtrees(highs[0], later_first=True):
+        new_tree = old_subtrees.get(subtree.root)
+        if new_tree is None:
+            # Newly in the top frequencies, so crop it from scratch
             new_tree = Tree(subtree.root, subtree.freq, [])
-            # If there are other categories in the original crime data, recurse through them
             if len(highs) > 1:
                 crop_tree(subtree, new_tree, highs[1:])
-            # Add this new complete subtree to the cropped tree
-            cropped_tree.subtrees.append(new_tree)
+        elif subtree.root in touched:
+            new_tree.freq = subtree.freq
+            if len(highs) > 1:
+                refresh_crop(subtree, new_tree, highs[1:], touched[subtree.root])
+        new_subtrees.append(new_tree)
+    cropped_tree.subtrees = new_subtrees
 
 
-def build_crime_tree(month: str, columns: list[str]) -> tuple[Tree, Tree]:
+@profiled('build_crime_tree')
+def build_crime_tree(month: str, columns: list[str], csv_path: str = CSV_PATH,
+                     max_paths: Optional[int] = None) -> tuple[Tree, Tree]:
     """Build a decision tree from the data stored in the csv file.
 
+    A single pass over the crime data builds the count cube of all twelve months (see CountCube), from which
+    the full tree of any month and hierarchy is derived without reading the data again. The data is read
+    from the column store cache of the csv file (see column_store.py), which is only rebuilt when the
+    csv file changes. Built trees are kept in an LRU cache keyed by (month, columns) until the csv file
+    changes, and their full trees are saved as snapshots (see snapshot_store.py), which later sessions load
+    instead of reading the data.
+
+    If max_paths is given, the month's rows are counted within a memory budget instead of through the count
+    cubes, which hold every combination of every column of every month: at most max_paths distinct paths are
+    counted in memory at a time and the rest are spilled to disk (see external_aggregate.py). The trees built
+    are the same either way.
+
     Preconditions:
         - len(columns) > 0
-        - 'dataset/2024_major_crime_indicators.csv' exists and format is valid
+        - max_paths is None or max_paths >= 1
+        - the csv file at csv_path exists and format is valid
     """
-    # Create a tree
-    full_tree = Tree(f'{month.title()} Crimes in Toronto', 0, [])
+    key = (month.lower(), tuple(columns), os.path.abspath(csv_path))
+    fingerprint = csv_fingerprint(csv_path)
+    cached = _cached_trees(key, fingerprint)
+    if cached is not None:
+        return cached
+
+    # Use the snapshot of the full tree if an earlier session already built it,
+    # otherwise derive it from the month's count cube
+    with phase('snapshot_load'):
+        full_tree = load_snapshot(month, columns, csv_path)
+    if full_tree is None:
+        if key[0] in MONTHS and max_paths is not None:
+            full_tree = build_month_tree(load_store(csv_path), month, columns, max_paths)
+        elif key[0] in MONTHS:
+            full_tree = load_cubes(csv_path)[key[0]].tree(columns)
+        else:
+            full_tree = Tree(f'{month.title()} Crimes in Toronto', 0, [])
+        with phase('snapshot_save'):
+            save_snapshot(full_tree, month, columns, csv_path)
 
-    # Open and read the csv file and complete the trees
-    with open('2024_major_crime_indicators.csv', 'r') as csv_file:
-        reader = csv.reader(csv_file)
-        titles = next(reader)
-
-        # Convert the user-selected hierarchy of columns into their indices in the title row
-        # Also create a list of the number of top frequencies for each level of the cropped tree
-        index_columns = []
-        top = []
-        top_number = 7
-        for i in range(len(columns)):
-            index_columns.append(titles.index(columns[i]))
-            if top_number > 2:
-                top.append(top_number)
-                top_number -= 2
-            else:
-                top.append(2)
-
-        # Insert each row of the crime data into the full tree and convert hours to day/night as well
-        for row in reader:
-            if row[11].lower() == month.lower():
-                if 6 <= int(row[15]) < 18:
-                    row[15] = 'Day'
-                else:
-                    row[15] = 'Night'
-                full_tree.insert_data(row, index_columns)
-
-        # Create the cropped tree from the full tree with the following orders:
-        # top 3 high frequency tree-depth-1 category, top 2 high frequency tree-depth-2 category,
-        # top 1 high frequency tree-depth-3 catagory
-        cropped_tree = Tree(f'{month.title()} High Frequency Crimes in Toronto', full_tree.freq, [])
-        crop_tree(full_tree, cropped_tree, top)
+    trees = _with_cropped_tree(month.title(), full_tree, len(columns))
+    _cache_trees(key, fingerprint, trees)
 
     # Return both of the trees
-    return (full_tree, cropped_tree)
+    return trees
+
+
+@profiled('build_range_tree')
+def build_range_tree(start: datetime.date, end: datetime.date, columns: list[str],
+                     csv_path: str = CSV_PATH) -> tuple[Tree, Tree]:
+    """Build the full and cropped trees of the crimes that occurred from start to end (both included).
+
+    The rows in the range are found by binary search in the date index of the csv file (see date_index.py),
+    and only those rows are read, so a short range costs a small fraction of a build from every row.
+    Quarters and years to date are ranges given by date_index.quarter and date_index.year_to_date.
+    Built trees are kept in the same LRU cache as those of build_crime_tree.
+
+    Preconditions:
+        - len(columns) > 0
+        - all(column in CUBE_COLUMNS for column in columns)
+        - the csv file at csv_path exists and format is valid
+    """
+    name = f'{start.isoformat()} to {end.isoformat()}'
+    key = (name, tuple(columns), os.path.abspath(csv_path))
+    fingerprint = csv_fingerprint(csv_path)
+    cached = _cached_trees(key, fingerprint)
+    if cached is not None:
+        return cached
+
+    store = load_store(csv_path)
+    with phase('range_select'):
+        rows = load_date_index(csv_path).rows_between(start, end)
+    full_tree = Tree(f'{name} Crimes in Toronto', 0, [])
+    tables = _label_tables(store, columns)
+    with phase('insert'):
+        for path, count in count_paths(store, columns, rows=rows).items():
+            full_tree.insert_path([table[code] for table, code in zip(tables, path)], count)
+
+    trees = _with_cropped_tree(name, full_tree, len(columns))
+    _cache_trees(key, fingerprint, trees)
+    return trees
+
+
+@profiled('build_radius_tree')
+def build_radius_tree(latitude: float, longitude: float, radius: float, columns: list[str],
+                      csv_path: str = CSV_PATH, month: Optional[str] = None,
+                      dates: Optional[tuple[datetime.date, datetime.date]] = None) -> tuple[Tree, Tree]:
+    """Build the full and cropped trees of the crimes that occurred within radius metres of the given point,
+    e.g. broken down by ['MCI_CATEGORY', 'PREMISES_TYPE'].
+
+    If month is given, only the crimes of that month are included, and if dates is given, only those that
+    occurred from its start to its end (both included). The rows near the point are found in the grid index
+    of the period (see spatial_index.py), which is built the first time the period is queried.
+
+    Preconditions:
+        - radius >= 0
+        - len(columns) > 0
+        - all(column in CUBE_COLUMNS for column in columns)
+        - month is None or dates is None
+        - the csv file at csv_path exists and format is valid
+    """
+    store = load_store(csv_path)
+    with phase('radius_select'):
+        rows = period_grid_index(csv_path, month, dates).within(latitude, longitude, radius)
+    period = '' if month is None else f'{month.title()} '
+    if dates is not None:
+        period = f'{dates[0].isoformat()} to {dates[1].isoformat()} '
+    full_tree = Tree(f'{period}Crimes within {radius:g} m of ({latitude:.5f}, {longitude:.5f})', 0, [])
+    tables = _label_tables(store, columns)
+    with phase('insert'):
+        for path, count in count_paths(store, columns, rows=rows).items():
+            full_tree.insert_path([table[code] for table, code in zip(tables, path)], count)
+
+    cropped_tree = Tree(f'{period}High Frequency Crimes within {radius:g} m', full_tree.freq, [])
+    with phase('crop_tree'):
+        crop_tree(full_tree, cropped_tree, crop_levels(len(columns)))
+    return full_tree, cropped_tree
+
+
+def period_grid_index(csv_path: str = CSV_PATH, month: Optional[str] = None,
+                      dates: Optional[tuple[datetime.date, datetime.date]] = None) -> GridIndex:
+    """Return the grid index of the crimes of the csv file at csv_path of the given month or date range, or of
+    every crime if both are None.
+
+    Preconditions:
+        - month is None or dates is None
+        - the csv file at csv_path exists and format is valid
+    """
+    if month is not None:
+        return load_grid_index(csv_path, month.lower(), lambda: month_rows(load_store(csv_path), month))
+    if dates is not None:
+        start, end = dates
+        return load_grid_index(csv_path, f'{start.isoformat()} to {end.isoformat()}',
+                               lambda: load_date_index(csv_path).rows_between(start, end))
+    return load_grid_index(csv_path)
+
+
+@profiled('build_lazy_tree')
+def build_lazy_tree(month: str, columns: list[str], csv_path: str = CSV_PATH) -> tuple[Tree, Tree]:
+    """Build the same trees as build_crime_tree, with a full tree whose levels are only built when visited.
+
+    The full tree is a LazyTree (see lazy_tree.py) holding the ids of the month's rows; cropping it only builds
+    the branches kept in the cropped tree. This is much faster and smaller for deep hierarchies of which only
+    a few branches are looked at, but queries that visit every node, such as searches, build the whole tree.
+    Built trees are kept in the same LRU cache as those of build_crime_tree, under the same key.
+
+    Preconditions:
+        - len(columns) > 0
+        - all(column in CUBE_COLUMNS for column in columns)
+        - the csv file at csv_path exists and format is valid
+    """
+    key = (month.lower(), tuple(columns), os.path.abspath(csv_path))
+    fingerprint = csv_fingerprint(csv_path)
+    cached = _cached_trees(key, fingerprint)
+    if cached is not None:
+        return cached
+
+    store = load_store(csv_path)
+    with phase('month_filter'):
+        rows = month_rows(store, month)
+    full_tree = LazyTree(f'{month.title()} Crimes in Toronto', len(rows), store, columns,
+                         _label_tables(store, columns), rows)
+    trees = _with_cropped_tree(month.title(), full_tree, len(columns))
+    _cache_trees(key, fingerprint, trees)
+    return trees
+
+
+class CountCube:
+    """The number of crimes of one month for every distinct combination of categories of CUBE_COLUMNS.
+
+    The full tree of any hierarchy of (some of) the cube columns is derived from the cube by adding up
+    the counts of the combinations that agree on those columns, without reading the crime data again.
+
+    Instance Attributes:
+    - month: lowercase name of the month
+    - counts: maps each distinct combination of codes of CUBE_COLUMNS (in that order) to its number of crimes,
+      in order of first occurrence in the data
+    - tables: the cleaned category of every code of each cube column, in CUBE_COLUMNS order, cleaned when looked up
+
+    >>> titles = ['OCC_MONTH', 'MCI_CATEGORY', 'PREMISES_TYPE'] + [c for c in CUBE_COLUMNS
+    ...     if c not in ('MCI_CATEGORY', 'PREMISES_TYPE')]
+    >>> rows = [['May', 'Assault', 'House'] + ['1'] * 7, ['May', 'Robbery', 'Outside'] + ['1'] * 7,
+    ...         ['May', 'Assault', 'Outside'] + ['1'] * 7]
+    >>> from column_store import encode_rows
+    >>> cube = build_cubes(encode_rows(titles, rows))['may']
+    >>> print(cube.tree(['PREMISES_TYPE', 'MCI_CATEGORY']), end='')
+    May Crimes in Toronto (3)
+      House (1)
+        Assault (1)
+      Outside (2)
+        Robbery (1)
+        Assault (1)
+    >>> print(cube.tree(['MCI_CATEGORY']), end='')
+    May Crimes in Toronto (3)
+      Assault (2)
+      Robbery (1)
+    """
+    month: str
+    counts: dict[tuple[int, ...], int]
+    tables: list[CodeTable]
+
+    def __init__(self, month: str, counts: dict[tuple[int, ...], int], tables: list[CodeTable]) -> None:
+        """Initialize a new cube of the given month."""
+        self.month = month
+        self.counts = counts
+        self.tables = tables
+
+    @profiled('insert')
+    def tree(self, columns: list[str]) -> Tree:
+        """Return the full tree of this month for the given hierarchy.
+
+        The tree is identical to the one built by inserting the month's rows with Tree.insert_data.
+
+        Preconditions:
+            - len(columns) > 0
+            - all(column in CUBE_COLUMNS for column in columns)
+        """
+        positions = [CUBE_COLUMNS.index(column) for column in columns]
+        # Add up the counts of the combinations that agree on the selected columns; since dictionaries keep
+        # insertion order, every projected combination stays at the first occurrence of any of its rows
+        projected = {}
+        for combination, count in self.counts.items():
+            path = tuple(combination[position] for position in positions)
+            projected[path] = projected.get(path, 0) + count
+
+        full_tree = Tree(f'{self.month.title()} Crimes in Toronto', 0, [])
+        tables = [self.tables[position] for position in positions]
+        for path, count in projected.items():
+            full_tree.insert_path([table[code] for table, code in zip(tables, path)], count)
+        return full_tree
+
+
+def load_cubes(csv_path: str) -> dict[str, CountCube]:
+    """Return the count cube of every month of the csv file at csv_path, keyed by lowercase month name.
+
+    The cubes are built in a single pass over the column store of the csv file and reused until the
+    csv file changes.
+    """
+    store = load_store(csv_path)
+    key = os.path.abspath(csv_path)
+    if key not in _cubes or _cubes[key][0] is not store:
+        # Splitting the rows by month happens while the cubes are built
+        with phase('month_filter'):
+            _cubes[key] = (store, build_cubes(store))
+    return _cubes[key][1]
+
+
+def build_cubes(store: ColumnStore) -> dict[str, CountCube]:
+    """Return the count cube of every month in MONTHS from the encoded columns of store.
+
+    Preconditions:
+        - every column in CUBE_COLUMNS is stored in store
+
+    >>> from column_store import encode_rows
+    >>> titles = ['OCC_MONTH', 'OFFENCE'] + [c for c in CUBE_COLUMNS if c != 'OFFENCE']
+    >>> rows = [[month, offence] + ['1'] * 8 for month, offence in [('March', 'Assault'), ('MARCH', 'Robbery'),
+    ...                                                              ('march', 'Robbery'), ('March', 'Robbery')]]
+    >>> print(build_cubes(encode_rows(titles, rows))['march'].tree(['OFFENCE']), end='')
+    March Crimes in Toronto (4)
+      Assault (1)
+      Robbery (3)
+    """
+    month_counts = {month: {} for month in MONTHS}
+    # Map every month code to its month's counts (or None for values that are not a month name)
+    clean_month = column_rule('OCC_MONTH')
+    counts_by_code = [month_counts.get(clean_month(label)) for label in store.labels['OCC_MONTH']]
+    for (month_code, *combination), count in count_paths(store, ['OCC_MONTH'] + CUBE_COLUMNS).items():
+        counts = counts_by_code[month_code]
+        if counts is not None:
+            # Several month codes, such as 'March' and 'MARCH', can belong to the same month
+            key = tuple(combination)
+            counts[key] = counts.get(key, 0) + count
+    tables = _label_tables(store, CUBE_COLUMNS)
+    return {month: CountCube(month, counts, tables) for month, counts in month_counts.items()}
+
+
+# The cubes of each csv file, with the column store they were built from
+_cubes: dict[str, tuple[ColumnStore, dict[str, CountCube]]] = {}
+
+
+def _with_cropped_tree(name: str, full_tree: Tree, depth: int) -> tuple[Tree, Tree]:
+    """Return full_tree together with its cropped tree of high frequency crimes, named after the period name.
+
+    The cropped tree keeps the top 7 high frequency tree-depth-1 categories, the top 5 high frequency
+    tree-depth-2 categories, the top 3 high frequency tree-depth-3 categories and the top 2 of every
+    deeper category.
+    """
+    cropped_tree = Tree(f'{name} High Frequency Crimes in Toronto', full_tree.freq, [])
+    with phase('crop_tree'):
+        crop_tree(full_tree, cropped_tree, crop_levels(depth))
+    return full_tree, cropped_tree
+
+
+def build_crime_tree_parallel(month: str, columns: list[str], workers: Optional[int] = None,
+                              csv_path: str = CSV_PATH) -> tuple[Tree, Tree]:
+    """Build the same trees as build_crime_tree by parsing the csv file in parallel.
+
+    The csv file is split into byte ranges aligned on line boundaries, a partial tree is built from each range
+    in a pool of worker processes and the partial trees are merged in file order. If workers is None,
+    one worker per CPU is used.
+
+    Preconditions:
+        - len(columns) > 0
+        - workers is None or workers >= 1
+        - no quoted field of the csv file contains a line break
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    with open(csv_path, 'rb') as csv_file:
+        titles = next(csv.reader([csv_file.readline().decode()]))
+        data_start = csv_file.tell()
+        file_end = csv_file.seek(0, os.SEEK_END)
+
+    # Split the data into a few chunks per worker so one slow chunk does not hold up the others
+    num_chunks = max(1, workers * 4)
+    bounds = [data_start + (file_end - data_start) * i // num_chunks for i in range(num_chunks + 1)]
+    jobs = [(csv_path, bounds[i], bounds[i + 1], month, titles, columns) for i in range(num_chunks)]
+
+    full_tree = Tree(f'{month.title()} Crimes in Toronto', 0, [])
+    with phase('parallel_build'):
+        if workers == 1:
+            for partial_tree in map(_build_chunk, jobs):
+                full_tree.merge(partial_tree)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for partial_tree in executor.map(_build_chunk, jobs):
+                    full_tree.merge(partial_tree)
+
+    return _with_cropped_tree(month.title(), full_tree, len(columns))
+
+
+def _build_chunk(job: tuple[str, int, int, str, list[str], list[str]]) -> Tree:
+    """Return the partial full tree of the csv rows that begin within the byte range [start, end).
+
+    job is (csv path, start, end, month, title row, columns).
+
+    Preconditions:
+        - start is after the end of the title row
+    """
+    csv_path, start, end, month, titles, columns = job
+    normalizer = RowNormalizer(titles, columns)
+    partial_tree = Tree(f'{month.title()} Crimes in Toronto', 0, [])
+
+    # Insert each row of the crime data into the partial tree
+    for row in read_rows(csv_path, start, end):
+        if row and normalizer.month(row) == month.lower():
+            partial_tree.insert_path(normalizer.path(row))
+    return partial_tree
+
+
+def read_rows(csv_path: str, start: int, end: int) -> list[list[str]]:
+    """Return the csv rows of the file at csv_path that begin within the byte range [start, end).
+
+    Preconditions:
+        - 0 < start <= end
+        - no quoted field of the csv file contains a line break
+    """
+    with open(csv_path, 'rb') as csv_file:
+        # Skip the rest of the line that contains the byte before start, since it belongs to the previous range
+        csv_file.seek(start - 1)
+        csv_file.readline()
+        lines = []
+        while csv_file.tell() < end:
+            line = csv_file.readline()
+            if not line:
+                break
+            lines.append(line.decode())
+    return list(csv.reader(lines))
+
+
+def build_month_tree(store: ColumnStore, month: str, columns: list[str], max_paths: Optional[int] = None) -> Tree:
+    """Return the full tree of the given month for the given hierarchy, built from the encoded columns of store.
+
+    Rather than inserting the rows one at a time, the rows of the month are selected with a mask over the
+    month column, the distinct combinations of codes are counted in bulk and each combination is then
+    inserted once with its count. The resulting tree is identical to inserting every row with
+    Tree.insert_data, including the order of the subtrees.
+
+    If max_paths is given, at most max_paths distinct combinations are counted in memory at a time, and
+    partial counts are spilled to disk and merged back (see external_aggregate.py).
+
+    Preconditions:
+        - len(columns) > 0
+        - every column in columns is stored in store
+        - max_paths is None or max_paths >= 1
+
+    >>> titles = ['OCC_MONTH', 'OCC_HOUR', 'MCI_CATEGORY', 'NEIGHBOURHOOD_158']
+    >>> rows = [['May', '3', 'Assault', 'Annex (95)'], ['June', '12', 'Robbery', 'Annex (95)'],
+    ...         ['May', '14', 'Robbery', 'Annex (95)'], ['May', '20', 'Assault', 'West Hill (136)'],
+    ...         ['May', '15', 'Assault', 'Annex (95)'], ['May', '13', 'Robbery', 'Annex (95)']]
+    >>> from normalize import day_or_night
+    >>> expected = Tree('May Crimes in Toronto', 0, [])
+    >>> for row in rows:
+    ...     if row[0] == 'May':
+    ...         expected.insert_data([row[2], day_or_night(row[1]), row[3]], [0, 1, 2])
+    >>> from column_store import encode_rows
+    >>> store = encode_rows(titles, rows)
+    >>> actual = build_month_tree(store, 'may', ['MCI_CATEGORY', 'OCC_HOUR', 'NEIGHBOURHOOD_158'])
+    >>> str(actual) == str(expected)
+    True
+    >>> spilled = build_month_tree(store, 'may', ['MCI_CATEGORY', 'OCC_HOUR', 'NEIGHBOURHOOD_158'], max_paths=1)
+    >>> str(spilled) == str(expected)
+    True
+    >>> print(actual, end='')
+    May Crimes in Toronto (5)
+      Assault (3)
+        Night (2)
+          Annex (1)
+          West Hill (1)
+        Day (1)
+          Annex (1)
+      Robbery (2)
+        Day (2)
+          Annex (2)
+    """
+    full_tree = Tree(f'{month.title()} Crimes in Toronto', 0, [])
+    tables = _label_tables(store, columns)
+    if max_paths is None:
+        paths = count_paths(store, columns, month).items()
+    else:
+        paths = aggregate_paths(select_paths(store, columns, month), len(columns), max_paths)
+    with phase('insert'):
+        for path, count in paths:
+            full_tree.insert_path([table[code] for table, code in zip(tables, path)], count)
+    return full_tree
+
+
+def count_paths(store: ColumnStore, columns: list[str], month: Optional[str] = None,
+                rows: Optional[array] = None) -> Counter[tuple[int, ...]]:
+    """Return the number of rows of store with each distinct combination of codes in the given columns.
+
+    If month is given, only the rows of that month are counted. If rows is given, only the rows with those
+    ids are read and counted. The combinations are in the order of their first occurrence in the data.
+
+    Preconditions:
+        - every column in columns is stored in store
+        - rows is None or its row ids are in increasing order
+    """
+    return Counter(select_paths(store, columns, month, rows))
+
+
+def select_paths(store: ColumnStore, columns: list[str], month: Optional[str] = None,
+                 rows: Optional[array] = None) -> Iterator[tuple[int, ...]]:
+    """Return an iterator over the codes in the given columns of each row of store, in file order.
+
+    If month is given, only the rows of that month are included. If rows is given, only the rows with those
+    ids are read.
+
+    Preconditions:
+        - every column in columns is stored in store
+        - rows is None or its row ids are in increasing order
+    """
+    if rows is None:
+        selected = zip(*[store.column(column) for column in columns])
+    else:
+        selected = zip(*[map(store.column(column).__getitem__, rows) for column in columns])
+    if month is not None:
+        in_month = _month_mask(store, month)
+        month_codes = store.column('OCC_MONTH')
+        if rows is not None:
+            month_codes = map(month_codes.__getitem__, rows)
+        selected = compress(selected, map(in_month.__getitem__, month_codes))
+    return selected
+
+
+def month_rows(store: ColumnStore, month: str) -> array:
+    """Return the ids of the rows of store that occurred in the given month (of any year), in file order."""
+    in_month = _month_mask(store, month)
+    return array('I', compress(range(store.num_rows), map(in_month.__getitem__, store.column('OCC_MONTH'))))
+
+
+def _month_mask(store: ColumnStore, month: str) -> list[bool]:
+    """Return whether each code of the month column of store is the given month."""
+    clean_month = column_rule('OCC_MONTH')
+    return [clean_month(label) == month.lower() for label in store.labels['OCC_MONTH']]
+
+
+def _label_tables(store: ColumnStore, columns: list[str]) -> list[CodeTable]:
+    """Return the tables of the cleaned category of every code of the given columns, using the cleaning rules of
+    normalize.py.
+
+    Codes are only cleaned when they are looked up, so a value that cannot be cleaned (such as a blank cell) only
+    fails the builds that use it.
+    """
+    return [CodeTable(store.labels[column], column_rule(column)) for column in columns]
+
+
+def crop_levels(depth: int) -> list[int]:
+    """Return the number of top frequencies to keep at each of the depth levels of a cropped tree.
+
+    >>> crop_levels(5)
+    [7, 5, 3, 2, 2]
+    """
+    top = []
+    top_number = 7
+    for _ in range(depth):
+        if top_number > 2:
+            top.append(top_number)
+            top_number -= 2
+        else:
+            top.append(2)
+    return top
+
+
+def clear_caches() -> None:
+    """Forget every tree, count cube, date index, grid index and column store kept in memory by this process.
+
+    Snapshots and column stores cached on disk are kept.
+    """
+    _tree_cache.clear()
+    _cubes.clear()
+    clear_date_indexes()
+    clear_grid_indexes()
+    clear_loaded_stores()
+
+
+def _cached_trees(key: tuple[str, tuple[str, ...], str], fingerprint: dict[str, int]) -> Optional[tuple[Tree, Tree]]:
+    """Return the trees stored in the tree cache under key, or None if there are none or they were built from a
+    csv file with a different fingerprint (i.e. before the csv file changed).
+    """
+    cached = _tree_cache.get(key)
+    if cached is None or cached[0] != fingerprint:
+        return None
+    _tree_cache.move_to_end(key)
+    return cached[1]
+
+
+def _cache_trees(key: tuple[str, tuple[str, ...], str], fingerprint: dict[str, int],
+                 trees: tuple[Tree, Tree]) -> None:
+    """Store trees, built from a csv file with the given fingerprint, in the tree cache under key, evicting the
+    least recently used entry if it is full.
+    """
+    _tree_cache[key] = (fingerprint, trees)
+    _tree_cache.move_to_end(key)
+    while len(_tree_cache) > TREE_CACHE_SIZE:
+        _tree_cache.popitem(last=False)
 
 
 if __name__ == '__main__':
-    pass
+    import doctest
+    doctest.testmod(verbose=True)
@@ -0,0 +1,212 @@
+"""CSC111 Project 2: Query Server
+
+This file serves the analysis queries of batch.py over HTTP on localhost, from a set of built trees shared by
+every client and kept in memory between requests. Endpoints:
+
+    POST /query   body: one query in the format of batch.py; replies {"result": ...} or {"error": ...}
+    GET  /trees   replies with the month and hierarchy of every tree currently held in memory
+
+Trees are built the first time a query needs them. Concurrent queries needing the same trees wait for a
+single build, and builds run in worker processes, so queries on trees that are already built keep being
+answered while others are built. Full trees are held as CompactTrees, so many of them fit in memory at once.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+import argparse
+import asyncio
+import json
+from crime_tree import Tree
+from compact_tree import CompactTree
+from batch import query_tree, run_query
+from render_data import CSV_PATH, TREE_CACHE_SIZE, build_crime_tree
+
+DEFAULT_PORT = 8111
+# Largest request body accepted, in bytes
+MAX_BODY = 1024 * 1024
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class QueryServer:
+    """An HTTP server answering queries from trees built on demand and shared between clients.
+
+    Instance Attributes:
+    - csv_path: path of the crime dataset the trees are built from
+    - max_trees: maximum number of (month, hierarchy) entries kept in memory
+    - max_paths: the number of distinct paths each build counts in memory before spilling to disk,
+      or None to build from the count cubes (see render_data.build_crime_tree)
+
+    Representation Invariants:
+    - self.max_trees >= 1
+    - self.max_paths is None or self.max_paths >= 1
+    """
+    csv_path: str
+    max_trees: int
+    max_paths: Optional[int]
+    # Private Instance Attributes:
+    # - _trees: maps each (month, columns) to the task building (or that built) its full tree in compact form
+    #   and its cropped tree, least recently used first
+    # - _executor: the worker processes in which trees are built
+    _trees: OrderedDict[tuple[str, tuple[str, ...]], asyncio.Task]
+    _executor: ProcessPoolExecutor
+
+    def __init__(self, csv_path: str = CSV_PATH, workers: Optional[int] = None,
+                 max_trees: int = TREE_CACHE_SIZE, max_paths: Optional[int] = None) -> None:
+        """Initialize a new server building its trees from the csv file at csv_path in up to workers processes."""
+        self.csv_path = csv_path
+        self.max_trees = max_trees
+        self.max_paths = max_paths
+        self._trees = OrderedDict()
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+
+    async def serve(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT) -> None:
+        """Answer requests on host and port until cancelled."""
+        server = await asyncio.start_server(self._handle, host, port)
+        print(f'Serving crime tree queries on http://{host}:{port}')
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._executor.shutdown(cancel_futures=True)
+
+    async def trees(self, month: str, columns: list[str]) -> tuple[CompactTree, Tree]:
+        """Return the full and cropped trees of the given month and hierarchy, building them if needed.
+
+        Callers asking for trees that are already being built wait for that build instead of starting another.
+        """
+        key = (month, tuple(columns))
+        task = self._trees.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._build(month, columns))
+            self._trees[key] = task
+            self._evict()
+        else:
+            self._trees.move_to_end(key)
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            # Forget failed builds, so the next request tries again
+            if self._trees.get(key) is task:
+                del self._trees[key]
+            raise
+
+    async def answer(self, method: str, path: str, body: bytes) -> tuple[int, Any]:
+        """Return the status code and JSON reply of the request with the given method, path and body."""
+        if path == '/trees':
+            if method != 'GET':
+                return 405, {'error': 'use GET for /trees'}
+            return 200, {'trees': [{'month': month, 'hierarchy': list(columns), 'built': task.done()}
+                                   for (month, columns), task in self._trees.items()]}
+        if path != '/query':
+            return 404, {'error': f'no such endpoint: {path}'}
+        if method != 'POST':
+            return 405, {'error': 'use POST for /query'}
+
+        try:
+            query = json.loads(body)
+        except (json.JSONDecodeError, UnicodeDecodeError) as error:
+            return 400, {'error': f'invalid JSON: {error}'}
+        if not isinstance(query, dict):
+            return 400, {'error': 'a query must be a JSON object'}
+        try:
+            month, columns = query_tree(query)
+            full_tree, cropped_tree = await self.trees(month, columns)
+            tree = cropped_tree if query.get('tree') == 'cropped' else full_tree
+            return 200, {'result': run_query(tree, query)}
+        except ValueError as error:
+            return 400, {'error': str(error)}
+
+    async def _build(self, month: str, columns: list[str]) -> tuple[CompactTree, Tree]:
+        """Build the full and cropped trees of the given month and hierarchy in a worker process."""
+        loop = asyncio.get_running_loop()
+        full_data, cropped_data = await loop.run_in_executor(self._executor, _build_snapshots, month, columns,
+                                                             self.csv_path, self.max_paths)
+        return CompactTree.from_bytes(full_data), Tree.from_bytes(cropped_data)
+
+    def _evict(self) -> None:
+        """Forget the least recently used built trees until at most self.max_trees entries are held."""
+        for key in list(self._trees):
+            if len(self._trees) <= self.max_trees:
+                break
+            if self._trees[key].done():
+                del self._trees[key]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Read one request from the connection, write its reply and close the connection."""
+        try:
+            status, reply = await self._read_and_answer(reader)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as error:
+            status, reply = 500, {'error': f'{type(error).__name__}: {error}'}
+        writer.write(_response(status, reply))
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def _read_and_answer(self, reader: asyncio.StreamReader) -> tuple[int, Any]:
+        """Read a request from reader and return the status code and JSON reply to it."""
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) != 3:
+            return 400, {'error': 'malformed request line'}
+        method, target, _ = request_line
+
+        length = 0
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'content-length':
+                if not value.strip().isdigit():
+                    return 400, {'error': 'invalid Content-Length'}
+                length = int(value)
+        if length > MAX_BODY:
+            return 413, {'error': f'request bodies are limited to {MAX_BODY} bytes'}
+        body = await reader.readexactly(length)
+        return await self.answer(method.upper(), target.split('?', 1)[0], body)
+
+
+def _build_snapshots(month: str, columns: list[str], csv_path: str,
+                     max_paths: Optional[int] = None) -> tuple[bytes, bytes]:
+    """Return the snapshots of the full and cropped trees of the given month and hierarchy.
+
+    This runs in a worker process, so the trees are sent back in their compact binary form.
+    """
+    full_tree, cropped_tree = build_crime_tree(month, columns, csv_path, max_paths)
+    return full_tree.to_bytes(), cropped_tree.to_bytes()
+
+
+def _response(status: int, reply: Any) -> bytes:
+    """Return the HTTP response with the given status code and JSON body.
+
+    >>> head, body = _response(404, {'error': 'x'}).split(b'\\r\\n\\r\\n')
+    >>> head.split(b'\\r\\n')[0], body
+    (b'HTTP/1.1 404 Not Found', b'{"error": "x"}')
+    """
+    body = json.dumps(reply).encode()
+    head = (f'HTTP/1.1 {status} {_REASONS[status]}\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n')
+    return head.encode() + body
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve crime tree queries over HTTP on localhost.')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='port to listen on')
+    parser.add_argument('--csv', default=CSV_PATH, help='crime dataset to build the trees from')
+    parser.add_argument('--workers', type=int, help='number of processes building trees (default: one per CPU)')
+    parser.add_argument('--max-paths', type=int,
+                        help='distinct paths each build counts in memory before spilling to disk (default: no limit)')
+    arguments = parser.parse_args()
+
+    query_server = QueryServer(arguments.csv, arguments.workers, max_paths=arguments.max_paths)
+    try:
+        asyncio.run(query_server.serve(arguments.host, arguments.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,398 @@
+"""CSC111 Project 2: Approximate Top Rankings
+
+This file answers top_rankings and top_specific queries approximately, without building a tree. The csv file
+is streamed once and every prefix of the path of each row is counted in two fixed-size sketches per level of
+the hierarchy: a SpaceSaving summary, which keeps the heavy hitters (the most frequent prefixes) with a
+guaranteed bound on their error, and a CountMinSketch, which tightens the estimate of any prefix. The memory
+used depends only on the sketch sizes, not on the size of the dataset.
+"""
+from __future__ import annotations
+from array import array
+from collections import Counter
+from typing import Any, Optional
+import argparse
+import csv
+import heapq
+import math
+from normalize import RowNormalizer
+from render_data import CSV_PATH, CUBE_COLUMNS
+
+# Default number of heavy hitters tracked at each level
+DEFAULT_CAPACITY = 1000
+# Default error of the count-min estimates, as a fraction of the number of rows, and probability of exceeding it
+DEFAULT_EPSILON = 0.0005
+DEFAULT_DELTA = 0.01
+# Number of rows counted exactly before being added to the sketches, which bounds the memory of a batch
+_BATCH_ROWS = 10000
+_MASK_32 = 0xFFFFFFFF
+
+
+class CountMinSketch:
+    """An approximate count of every key added, in a fixed-size table.
+
+    An estimate is never below the true count of its key. With width = ceil(e / epsilon) and
+    depth = ceil(ln(1 / delta)), it exceeds the true count by more than epsilon * self.total with probability
+    at most delta.
+
+    Instance Attributes:
+    - width: number of counters in each row of the table
+    - depth: number of rows of the table, each with its own hash function
+    - total: sum of the counts of every key added
+
+    Representation Invariants:
+    - self.width >= 1 and self.depth >= 1
+    - self.total >= 0
+
+    >>> sketch = CountMinSketch.with_error(0.01, 0.01)
+    >>> sketch.width, sketch.depth
+    (272, 5)
+    >>> for key in ['Assault', 'Theft', 'Assault']:
+    ...     sketch.add(key)
+    >>> sketch.estimate('Assault') >= 2, sketch.estimate('Theft') >= 1, sketch.total
+    (True, True, 3)
+    """
+    width: int
+    depth: int
+    total: int
+    # Private Instance Attributes:
+    # - _table: the counters, row by row
+    _table: array
+
+    def __init__(self, width: int, depth: int) -> None:
+        """Initialize a new, empty sketch with the given table size.
+
+        Preconditions:
+            - width >= 1 and depth >= 1
+        """
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self._table = array('q', bytes(8 * width * depth))
+
+    @classmethod
+    def with_error(cls, epsilon: float, delta: float) -> CountMinSketch:
+        """Return a new, empty sketch whose estimates exceed the true counts by more than epsilon times the total
+        count with probability at most delta.
+
+        Preconditions:
+            - 0 < epsilon < 1 and 0 < delta < 1
+        """
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)))
+
+    def add(self, key: Any, count: int = 1) -> None:
+        """Add count occurrences of key.
+
+        Preconditions:
+            - key is hashable
+            - count >= 0
+        """
+        table = self._table
+        for cell in self._cells(key):
+            table[cell] += count
+        self.total += count
+
+    def estimate(self, key: Any) -> int:
+        """Return the estimated number of occurrences of key, which is at least the true number."""
+        table = self._table
+        return min(table[cell] for cell in self._cells(key))
+
+    def _cells(self, key: Any) -> list[int]:
+        """Return the index in the table of the counter of key in each row.
+
+        The hash functions of the rows are derived from two halves of the hash of key (double hashing).
+        """
+        hashed = hash(key)
+        first = hashed & _MASK_32
+        second = ((hashed >> 32) & _MASK_32) | 1
+        width = self.width
+        return [row * width + (first + row * second) % width for row in range(self.depth)]
+
+
+class SpaceSaving:
+    """The (approximately) most frequent keys added, tracked in a fixed number of counters.
+
+    Each tracked key has a count that is at least its true count and at most error more than it, and the error
+    of every key is at most self.total / self.capacity. Every key whose true count is more than
+    self.total / self.capacity is tracked.
+
+    Instance Attributes:
+    - capacity: the maximum number of keys tracked
+    - total: sum of the counts of every key added
+
+    Representation Invariants:
+    - self.capacity >= 1
+    - self.total >= 0
+
+    >>> summary = SpaceSaving(2)
+    >>> for key in ['Assault', 'Theft', 'Assault', 'Robbery', 'Assault']:
+    ...     summary.add(key)
+    >>> summary.top(2)
+    [('Assault', 3, 0), ('Robbery', 2, 1)]
+    """
+    capacity: int
+    total: int
+    # Private Instance Attributes:
+    # - _counts: maps each tracked key to its count and error, in order of when it was last started being tracked
+    # - _heap: a min-heap with one (count, key) entry per tracked key, whose count may be lower than the key's
+    #   current count, since entries are only brought up to date when they reach the top of the heap
+    _counts: dict[Any, list[int]]
+    _heap: list[tuple[int, Any]]
+
+    def __init__(self, capacity: int) -> None:
+        """Initialize a new, empty summary tracking up to capacity keys.
+
+        Preconditions:
+            - capacity >= 1
+        """
+        self.capacity = capacity
+        self.total = 0
+        self._counts = {}
+        self._heap = []
+
+    def add(self, key: Any, count: int = 1) -> None:
+        """Add count occurrences of key, replacing the tracked key with the lowest count if key is not
+        tracked and the summary is full.
+
+        Preconditions:
+            - key is hashable and comparable to the other keys added
+            - count >= 1
+        """
+        self.total += count
+        entry = self._counts.get(key)
+        if entry is not None:
+            entry[0] += count
+            return
+        if len(self._counts) < self.capacity:
+            self._counts[key] = [count, 0]
+            heapq.heappush(self._heap, (count, key))
+            return
+
+        # Find the key with the lowest count, bringing stale heap entries up to date on the way
+        while True:
+            lowest, lowest_key = self._heap[0]
+            current = self._counts[lowest_key][0]
+            if current == lowest:
+                break
+            heapq.heapreplace(self._heap, (current, lowest_key))
+        del self._counts[lowest_key]
+        self._counts[key] = [lowest + count, lowest]
+        heapq.heapreplace(self._heap, (lowest + count, key))
+
+    def count(self, key: Any) -> Optional[tuple[int, int]]:
+        """Return the count and error of key, or None if key is not tracked."""
+        entry = self._counts.get(key)
+        return None if entry is None else (entry[0], entry[1])
+
+    def max_error(self) -> int:
+        """Return the highest error of a tracked key, which is at most self.total / self.capacity."""
+        return max((error for _, error in self._counts.values()), default=0)
+
+    def top(self, k: Optional[int] = None) -> list[tuple[Any, int, int]]:
+        """Return the (at most) k tracked keys with the highest counts, as (key, count, error), highest first.
+
+        If k is None, every tracked key is returned.
+
+        Preconditions:
+            - k is None or k >= 0
+        """
+        items = [(key, count, error) for key, (count, error) in self._counts.items()]
+        if k is None:
+            return sorted(items, key=lambda item: item[1], reverse=True)
+        return heapq.nlargest(k, items, key=lambda item: item[1])
+
+
+class ApproximateTree:
+    """Approximate frequencies of the paths of a crime tree, answering its ranking queries from sketches.
+
+    Level d of the hierarchy (the subtrees of the root are at level 1) has a SpaceSaving summary and a
+    CountMinSketch of the paths of length d. The estimate of a path is the lower of its counts in the two,
+    both of which are never below its true frequency.
+
+    Instance Attributes:
+    - root: the name of the tree
+    - columns: the hierarchy of the tree
+    - total: the number of rows counted
+
+    Representation Invariants:
+    - len(self.columns) >= 1
+
+    >>> tree = ApproximateTree('Root', ['MCI_CATEGORY', 'OCC_HOUR'], capacity=10)
+    >>> for path in [['Theft', 'Day'], ['Theft', 'Night'], ['Assault', 'Day'], ['Theft', 'Day']]:
+    ...     tree.add_path(path)
+    >>> tree.top_rankings(1, 2)
+    {1: ('Theft', 3), 2: ('Assault', 1)}
+    >>> tree.top_specific('Theft')
+    ('Theft', {1: ('Day', 2), 2: ('Night', 1)})
+    >>> tree.error_bound(1)
+    0
+    """
+    root: str
+    columns: list[str]
+    total: int
+    # Private Instance Attributes:
+    # - _levels: the heavy hitter summary and count-min sketch of the paths of each length, shortest first
+    _levels: list[tuple[SpaceSaving, CountMinSketch]]
+
+    def __init__(self, root: str, columns: list[str], capacity: int = DEFAULT_CAPACITY,
+                 epsilon: float = DEFAULT_EPSILON, delta: float = DEFAULT_DELTA) -> None:
+        """Initialize a new, empty approximate tree of the given hierarchy, tracking capacity heavy hitters
+        and a count-min sketch with error epsilon and failure probability delta at each level.
+
+        Preconditions:
+            - len(columns) >= 1
+            - capacity >= 1
+            - 0 < epsilon < 1 and 0 < delta < 1
+        """
+        self.root = root
+        self.columns = columns
+        self.total = 0
+        self._levels = [(SpaceSaving(capacity), CountMinSketch.with_error(epsilon, delta)) for _ in columns]
+
+    def add_path(self, path: list[str], count: int = 1) -> None:
+        """Add count rows with the given categories, one per column of the hierarchy.
+
+        Preconditions:
+            - len(path) == len(self.columns)
+            - count >= 1
+        """
+        self.total += count
+        key = ()
+        for value, (summary, sketch) in zip(path, self._levels):
+            key += (value,)
+            summary.add(key, count)
+            sketch.add(key, count)
+
+    def estimate(self, path: list[str]) -> int:
+        """Return the estimated frequency of the node at the end of path, which is at least its true frequency.
+
+        Preconditions:
+            - 1 <= len(path) <= len(self.columns)
+        """
+        summary, sketch = self._levels[len(path) - 1]
+        tracked = summary.count(tuple(path))
+        estimate = sketch.estimate(tuple(path))
+        return estimate if tracked is None else min(tracked[0], estimate)
+
+    def error_bound(self, depth: int) -> int:
+        """Return the most by which the frequency of a ranked node at the given depth can be overestimated.
+
+        The bound is guaranteed; the count-min sketches usually make the actual error much smaller.
+
+        Preconditions:
+            - 1 <= depth <= len(self.columns)
+        """
+        return self._levels[depth - 1][0].max_error()
+
+    def top_rankings(self, beginning: int, end: int) -> dict[int, tuple[str, int]]:
+        """Return the estimated ranks beginning to end of the subtrees of the root by frequency, mapped to their
+        category and estimated frequency, like Tree.top_rankings.
+
+        Every subtree more frequent than self.total / capacity is tracked, and the estimated frequencies are
+        at most self.error_bound(1) too high. Fewer than end - beginning + 1 subtrees are returned if fewer
+        are tracked.
+
+        Preconditions:
+            - 1 <= beginning <= end
+        """
+        ranked = self._ranked(1, ())[beginning - 1:end]
+        return {beginning + i: (path[-1], freq) for i, (path, freq) in enumerate(ranked)}
+
+    def top_specific(self, specific: str) -> tuple[str, dict[int, tuple[str, int]]]:
+        """Return the category of the subtree of the root matching specific and the estimated ranking by
+        frequency of its subtrees, like Tree.top_specific, or ('', {}) if no tracked subtree of the root matches.
+
+        Like Tree.top_specific, a subtree matches if its category contains specific, ignoring case. Tree picks
+        the first match in the order of the data, which the sketches do not keep, so this picks the category
+        equal to specific (ignoring case) if one is tracked and the most frequent match otherwise. Only
+        subtrees that are heavy hitters of their level are ranked.
+
+        >>> tree = ApproximateTree('Root', ['MCI_CATEGORY', 'OCC_HOUR'], capacity=10)
+        >>> for path in [['Theft', 'Day'], ['Theft Over', 'Night'], ['Theft Over', 'Day'], ['Assault', 'Day']]:
+        ...     tree.add_path(path)
+        >>> tree.top_specific('sault')
+        ('Assault', {1: ('Day', 1)})
+        >>> tree.top_specific('theft')
+        ('Theft', {1: ('Day', 1)})
+        >>> tree.top_specific('OVER')
+        ('Theft Over', {1: ('Night', 1), 2: ('Day', 1)})
+        >>> tree.top_specific('Robbery')
+        ('', {})
+        """
+        value = specific.lower()
+        matches = [path for path, _ in self._ranked(1, ()) if value in path[0].lower()]
+        if not matches:
+            return '', {}
+        node = next((path for path in matches if path[0].lower() == value), matches[0])
+        if len(self.columns) == 1:
+            return node[0], {}
+        ranked = self._ranked(2, node)
+        return node[0], {i + 1: (path[-1], freq) for i, (path, freq) in enumerate(ranked)}
+
+    def _ranked(self, depth: int, prefix: tuple[str, ...]) -> list[tuple[tuple[str, ...], int]]:
+        """Return the tracked paths of length depth starting with prefix and their estimated frequencies,
+        highest first.
+        """
+        summary, sketch = self._levels[depth - 1]
+        estimates = [(path, min(count, sketch.estimate(path))) for path, count, _ in summary.top()
+                     if path[:-1] == prefix]
+        estimates.sort(key=lambda item: item[1], reverse=True)
+        return estimates
+
+
+def sketch_csv(columns: list[str], csv_path: str = CSV_PATH, month: Optional[str] = None,
+               capacity: int = DEFAULT_CAPACITY, epsilon: float = DEFAULT_EPSILON,
+               delta: float = DEFAULT_DELTA) -> ApproximateTree:
+    """Return the approximate tree of the given hierarchy of the rows of the csv file at csv_path, streaming
+    the file once. If month is given, only the rows of that month (of any year) are counted.
+
+    Preconditions:
+        - len(columns) >= 1
+        - all(column in CUBE_COLUMNS for column in columns)
+        - the csv file at csv_path exists and format is valid
+    """
+    name = 'Crimes in Toronto' if month is None else f'{month.title()} Crimes in Toronto'
+    tree = ApproximateTree(name, columns, capacity, epsilon, delta)
+    with open(csv_path, 'r', newline='') as csv_file:
+        reader = csv.reader(csv_file)
+        normalizer = RowNormalizer(next(reader), columns)
+        batch = Counter()
+        rows = 0
+        for row in reader:
+            if not row or (month is not None and normalizer.month(row) != month.lower()):
+                continue
+            batch[tuple(normalizer.path(row))] += 1
+            rows += 1
+            if rows == _BATCH_ROWS:
+                _add_batch(tree, batch)
+                rows = 0
+        _add_batch(tree, batch)
+    return tree
+
+
+def _add_batch(tree: ApproximateTree, batch: Counter[tuple[str, ...]]) -> None:
+    """Add the paths counted in batch to tree and empty batch."""
+    for path, count in batch.items():
+        tree.add_path(list(path), count)
+    batch.clear()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rank crime categories approximately in one pass over the data.')
+    parser.add_argument('columns', nargs='+', choices=CUBE_COLUMNS, help='the hierarchy, top level first')
+    parser.add_argument('--month', help='only count the crimes of this month (default: every month)')
+    parser.add_argument('--top', type=int, default=10, help='number of top level categories to rank')
+    parser.add_argument('--specific', help='also rank the subcategories of this category')
+    parser.add_argument('--capacity', type=int, default=DEFAULT_CAPACITY, help='heavy hitters tracked per level')
+    parser.add_argument('--csv', default=CSV_PATH, help='crime dataset to read')
+    arguments = parser.parse_args()
+
+    approximate = sketch_csv(arguments.columns, arguments.csv, arguments.month, arguments.capacity)
+    print(f'{approximate.root} ({approximate.total} crimes, frequencies overestimated by at most '
+          f'{approximate.error_bound(1)} at the top level)')
+    for rank, (category, frequency) in approximate.top_rankings(1, arguments.top).items():
+        print(f'{rank:>4}. {category} ({frequency})')
+    if arguments.specific is not None:
+        name, rankings = approximate.top_specific(arguments.specific)
+        print(f'\n{name or arguments.specific}:' + ('' if rankings else ' not found'))
+        for rank, (category, frequency) in rankings.items():
+            print(f'{rank:>4}. {category} ({frequency})')
@@ -0,0 +1,67 @@
+"""CSC111 Project 2: Tree Snapshot Store
+
+This file stores binary snapshots of built full trees on disk, so trees built in one session can be
+loaded by the next one instead of being built again. Snapshots are keyed by month, column hierarchy and
+a fingerprint of the csv file they were built from, and the least recently used snapshots are removed
+once the store grows past its size cap.
+"""
+from __future__ import annotations
+from typing import Optional
+import hashlib
+import json
+import os
+from crime_tree import Tree
+from column_store import CACHE_DIR, csv_fingerprint, evict_least_recently_used, touch
+
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, 'snapshots')
+# Maximum total size of the snapshot files, in bytes
+SNAPSHOT_CAP = 256 * 1024 * 1024
+_SUFFIX = '.tree'
+
+
+def load_snapshot(month: str, columns: list[str], csv_path: str,
+                  directory: str = SNAPSHOT_DIR) -> Optional[Tree]:
+    """Return the snapshot of the full tree of the given month and hierarchy built from the current
+    contents of the csv file at csv_path, or None if there is no such snapshot.
+    """
+    path = os.path.join(directory, snapshot_key(month, columns, csv_path) + _SUFFIX)
+    try:
+        with open(path, 'rb') as snapshot_file:
+            data = snapshot_file.read()
+        tree = Tree.from_bytes(data)
+    except (OSError, ValueError):
+        return None
+    # Mark the snapshot as recently used, so it is the last to be evicted; another process may have evicted it
+    # since it was read
+    touch(path)
+    return tree
+
+
+def save_snapshot(tree: Tree, month: str, columns: list[str], csv_path: str, directory: str = SNAPSHOT_DIR,
+                  cap: int = SNAPSHOT_CAP) -> None:
+    """Store a snapshot of the full tree of the given month and hierarchy built from the csv file at csv_path,
+    then evict the least recently used snapshots until the store is no larger than cap bytes.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, snapshot_key(month, columns, csv_path) + _SUFFIX)
+    # Write under a name of this process's own, in case another process is saving the same snapshot
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as snapshot_file:
+        snapshot_file.write(tree.to_bytes())
+    os.replace(temporary, path)
+    evict_least_recently_used(directory, _SUFFIX, cap)
+
+
+def snapshot_key(month: str, columns: list[str], csv_path: str) -> str:
+    """Return the name identifying the snapshot of the given month and hierarchy of the csv file's current contents.
+
+    Changing the csv file changes its fingerprint, so snapshots of older contents are never found again
+    and are eventually evicted.
+    """
+    source = {'month': month.lower(), 'columns': list(columns), 'csv': os.path.abspath(csv_path),
+              'fingerprint': csv_fingerprint(csv_path)}
+    return hashlib.sha1(json.dumps(source, sort_keys=True).encode()).hexdigest()
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,223 @@
+"""CSC111 Project 2: Spatial Grid Index
+
+This file indexes the rows of the crime dataset by location (LAT_WGS84 and LONG_WGS84) on a uniform grid of
+square cells, so the rows within a radius of a point are found by looking only at the cells the circle
+overlaps, and heatmap counts are read from the sizes of the cells instead of a scan of every row.
+
+Coordinates are projected onto a flat plane in metres around the centre of Toronto, which over the extent
+of the city is accurate to well under one percent.
+"""
+from __future__ import annotations
+from array import array
+from collections import OrderedDict
+from typing import Callable, Optional
+import math
+import os
+from column_store import ColumnStore, load_store
+from profiler import phase
+
+# The point the coordinates are projected around, as (latitude, longitude)
+ORIGIN = (43.7, -79.4)
+# Default side of a grid cell, in metres
+DEFAULT_CELL_SIZE = 250.0
+# Maximum number of grid indexes kept in memory
+GRID_CACHE_SIZE = 16
+_EARTH_RADIUS = 6371008.8
+# Coordinates further than this from ORIGIN, in metres, are treated as missing (the dataset uses 0 for those)
+_MAX_DISTANCE = 200000.0
+
+
+class GridIndex:
+    """Rows of a column store bucketed by the grid cell of their location.
+
+    Rows whose location is missing or invalid are left out of the index.
+
+    Instance Attributes:
+    - cell_size: the side of every cell, in metres
+    - rows: the row id of each indexed row, grouped by cell and in increasing order within a cell
+    - xs: the projected east-west position of each row in rows, in metres east of ORIGIN
+    - ys: the projected north-south position of each row in rows, in metres north of ORIGIN
+
+    Representation Invariants:
+    - self.cell_size > 0
+    - len(self.rows) == len(self.xs) == len(self.ys)
+
+    >>> from column_store import encode_rows
+    >>> store = encode_rows(['LAT_WGS84', 'LONG_WGS84'], [['43.7', '-79.4'], ['43.7009', '-79.4'],
+    ...                                                  ['0', '0'], ['43.7', '-79.39'], ['43.6991', '-79.4']])
+    >>> index = build_grid_index(store)
+    >>> list(index.within(43.7, -79.4, 150))
+    [0, 1, 4]
+    >>> list(index.within(43.7, -79.4, 1000))
+    [0, 1, 3, 4]
+    >>> index.heatmap(scale=8)
+    [(43.68201, -79.4, 1), (43.7, -79.4, 3)]
+    """
+    cell_size: float
+    rows: array
+    xs: array
+    ys: array
+    # Private Instance Attributes:
+    # - _cells: maps the (column, row) of each non-empty cell to the slice of self.rows holding its rows
+    _cells: dict[tuple[int, int], tuple[int, int]]
+
+    def __init__(self, cell_size: float, rows: array, xs: array, ys: array,
+                 cells: dict[tuple[int, int], tuple[int, int]]) -> None:
+        """Initialize a new grid index from its arrays, grouped by cell, and the slice of every cell."""
+        self.cell_size = cell_size
+        self.rows = rows
+        self.xs = xs
+        self.ys = ys
+        self._cells = cells
+
+    def within(self, latitude: float, longitude: float, radius: float) -> array:
+        """Return the ids of the rows within radius metres of the given point, in file order.
+
+        Only the rows of the cells the circle overlaps are read, and those of cells entirely inside the circle
+        are taken without measuring their distances.
+
+        Preconditions:
+            - radius >= 0
+        """
+        x, y = project(latitude, longitude)
+        size = self.cell_size
+        squared = radius * radius
+        selected = array('I')
+        for column in range(math.floor((x - radius) / size), math.floor((x + radius) / size) + 1):
+            for row in range(math.floor((y - radius) / size), math.floor((y + radius) / size) + 1):
+                bounds = self._cells.get((column, row))
+                if bounds is None:
+                    continue
+                start, end = bounds
+                # The corner of the cell furthest from the point
+                far_x = max(abs(column * size - x), abs((column + 1) * size - x))
+                far_y = max(abs(row * size - y), abs((row + 1) * size - y))
+                if far_x * far_x + far_y * far_y <= squared:
+                    selected.extend(self.rows[start:end])
+                else:
+                    xs, ys, rows = self.xs, self.ys, self.rows
+                    selected.extend(rows[i] for i in range(start, end)
+                                    if (xs[i] - x) ** 2 + (ys[i] - y) ** 2 <= squared)
+        return array('I', sorted(selected))
+
+    def heatmap(self, scale: int = 1) -> list[tuple[float, float, int]]:
+        """Return the number of indexed rows in every non-empty square of scale by scale cells, as
+        (latitude, longitude, count) of the south-west corner of the square, from south-west to north-east.
+
+        Preconditions:
+            - scale >= 1
+        """
+        counts = {}
+        for (column, row), (start, end) in self._cells.items():
+            square = (column // scale, row // scale)
+            counts[square] = counts.get(square, 0) + end - start
+        size = self.cell_size * scale
+        heatmap = []
+        for (column, row), count in sorted(counts.items(), key=lambda item: (item[0][1], item[0][0])):
+            latitude, longitude = unproject(column * size, row * size)
+            heatmap.append((round(latitude, 5), round(longitude, 5), count))
+        return heatmap
+
+
+def build_grid_index(store: ColumnStore, rows: Optional[array] = None,
+                     cell_size: float = DEFAULT_CELL_SIZE) -> GridIndex:
+    """Return the grid index of the rows of store with the given ids (or every row if rows is None).
+
+    Preconditions:
+        - 'LAT_WGS84' and 'LONG_WGS84' are stored in store
+        - rows is None or its row ids are in increasing order
+        - cell_size > 0
+    """
+    latitudes = store.number_column('LAT_WGS84')
+    longitudes = store.number_column('LONG_WGS84')
+    if rows is None:
+        rows = range(store.num_rows)
+
+    by_cell = {}
+    for row in rows:
+        x, y = project(latitudes[row], longitudes[row])
+        # Missing coordinates are nan, which fails this test too
+        if not (abs(x) <= _MAX_DISTANCE and abs(y) <= _MAX_DISTANCE):
+            continue
+        cell = (math.floor(x / cell_size), math.floor(y / cell_size))
+        entries = by_cell.get(cell)
+        if entries is None:
+            entries = by_cell[cell] = []
+        entries.append((row, x, y))
+
+    indexed_rows, xs, ys = array('I'), array('d'), array('d')
+    cells = {}
+    for cell, entries in by_cell.items():
+        cells[cell] = (len(indexed_rows), len(indexed_rows) + len(entries))
+        for row, x, y in entries:
+            indexed_rows.append(row)
+            xs.append(x)
+            ys.append(y)
+    return GridIndex(cell_size, indexed_rows, xs, ys, cells)
+
+
+def load_grid_index(csv_path: str, period: Optional[str] = None, select: Optional[Callable[[], array]] = None,
+                    cell_size: float = DEFAULT_CELL_SIZE) -> GridIndex:
+    """Return the grid index of the rows of the csv file at csv_path of the given period, such as a month or a
+    date range, or of every row if period is None.
+
+    select returns the ids of the rows of period; it is only called when the index is built. Indexes are reused
+    for the same csv file, period and cell size until the csv file changes, and the least recently used are
+    forgotten once more than GRID_CACHE_SIZE are kept.
+
+    Preconditions:
+        - (period is None) == (select is None)
+        - select returns row ids in increasing order, and always the same ones for the same period
+        - cell_size > 0
+    """
+    store = load_store(csv_path)
+    key = (os.path.abspath(csv_path), period, cell_size)
+    if key in _grids and _grids[key][0] is store:
+        _grids.move_to_end(key)
+        return _grids[key][1]
+    with phase('grid_index'):
+        index = build_grid_index(store, None if select is None else select(), cell_size)
+    _grids[key] = (store, index)
+    _grids.move_to_end(key)
+    while len(_grids) > GRID_CACHE_SIZE:
+        _grids.popitem(last=False)
+    return index
+
+
+# The grid indexes of each (csv file, period, cell size), with the column store they were built from
+_grids: OrderedDict[tuple[str, Optional[str], float], tuple[ColumnStore, GridIndex]] = OrderedDict()
+
+
+def clear_grid_indexes() -> None:
+    """Forget the grid indexes built by this process."""
+    _grids.clear()
+
+
+def project(latitude: float, longitude: float) -> tuple[float, float]:
+    """Return the position of the given point in metres east and north of ORIGIN.
+
+    >>> project(*ORIGIN)
+    (0.0, 0.0)
+    >>> round(project(43.709, -79.4)[1])
+    1001
+    """
+    return (math.radians(longitude - ORIGIN[1]) * _EARTH_RADIUS * _COS_ORIGIN,
+            math.radians(latitude - ORIGIN[0]) * _EARTH_RADIUS)
+
+
+def unproject(x: float, y: float) -> tuple[float, float]:
+    """Return the latitude and longitude of the point x metres east and y metres north of ORIGIN.
+
+    >>> [round(value, 6) for value in unproject(*project(43.65, -79.38))]
+    [43.65, -79.38]
+    """
+    return (ORIGIN[0] + math.degrees(y / _EARTH_RADIUS),
+            ORIGIN[1] + math.degrees(x / (_EARTH_RADIUS * _COS_ORIGIN)))
+
+
+_COS_ORIGIN = math.cos(math.radians(ORIGIN[0]))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
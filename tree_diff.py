@@ -0,0 +1,247 @@
+"""CSC111 Project 2: Tree Comparison
+
+This file compares crime trees of the same hierarchy across periods, such as month over month. Two trees are
+compared in a single merged walk into a DeltaTree holding the old frequency, new frequency and change of every
+path, which answers "biggest movers" queries. A whole series of trees, such as all twelve months, is merged once
+into a SeriesTree that keeps every path a single time with its frequency in each period, so the delta between
+any two periods is read from it without building or walking the period trees again.
+"""
+from __future__ import annotations
+from typing import Any, Iterator, Optional
+import heapq
+from crime_tree import Tree
+from render_data import CSV_PATH, MONTHS, build_crime_tree
+
+
+class DeltaTree:
+    """The change in frequency of every path between an old and a new tree of the same hierarchy.
+
+    Instance Attributes:
+    - root: value of node
+    - old: frequency of node in the old tree (0 if it is only in the new tree)
+    - new: frequency of node in the new tree (0 if it is only in the old tree)
+    - subtrees: list of subtrees of the node
+
+    Representation Invariants:
+    - self.old >= 0 and self.new >= 0
+    - the root values of self.subtrees are distinct
+
+    >>> march = Tree("March", 0, [])
+    >>> for row in [["Theft", "Day"], ["Theft", "Night"], ["Assault", "Day"]]:
+    ...     march.insert_data(row, [0, 1])
+    >>> april = Tree("April", 0, [])
+    >>> for row in [["Assault", "Day"], ["Assault", "Day"], ["Theft", "Day"], ["Robbery", "Night"]]:
+    ...     april.insert_data(row, [0, 1])
+    >>> delta = diff_trees(march, april)
+    >>> print(delta, end='')
+    March to April (3 -> 4, +1)
+      Theft (2 -> 1, -1)
+        Day (1 -> 1, +0)
+        Night (1 -> 0, -1)
+      Assault (1 -> 2, +1)
+        Day (1 -> 2, +1)
+      Robbery (0 -> 1, +1)
+        Night (0 -> 1, +1)
+    >>> delta.biggest_movers(2, depth=1)
+    [(['March to April', 'Theft'], 2, 1, -1), (['March to April', 'Assault'], 1, 2, 1)]
+    >>> delta.biggest_movers(1, grew=True)
+    [(['March to April', 'Assault'], 1, 2, 1)]
+    """
+    root: Any
+    old: int
+    new: int
+    subtrees: list[DeltaTree]
+
+    def __init__(self, root: Any, old: int, new: int, subtrees: list[DeltaTree]) -> None:
+        """Initialize a new delta tree with the given root value, frequencies and subtrees."""
+        self.root = root
+        self.old = old
+        self.new = new
+        self.subtrees = subtrees
+
+    @property
+    def change(self) -> int:
+        """The new frequency minus the old frequency of the node."""
+        return self.new - self.old
+
+    def __str__(self, level: int = 0) -> str:
+        """Return a string representation of the delta tree, one node per line.
+
+        Preconditions:
+            - level >= 0
+        """
+        lines = []
+        stack = [(self, level)]
+        while stack:
+            node, depth = stack.pop()
+            lines.append('  ' * depth + f'{node.root} ({node.old} -> {node.new}, {node.change:+d})\n')
+            stack.extend((subtree, depth + 1) for subtree in reversed(node.subtrees))
+        return ''.join(lines)
+
+    def paths(self, depth: Optional[int] = None) -> Iterator[tuple[list[Any], DeltaTree]]:
+        """Yield the path to every node below the root in preorder, with the node itself.
+
+        If depth is given, only nodes at that depth (the subtrees of the root are at depth 1) are yielded.
+
+        Preconditions:
+            - depth is None or depth >= 1
+        """
+        stack = [([self.root, subtree.root], subtree) for subtree in reversed(self.subtrees)]
+        while stack:
+            path, node = stack.pop()
+            if depth is None or len(path) - 1 == depth:
+                yield path, node
+            if depth is None or len(path) - 1 < depth:
+                stack.extend((path + [subtree.root], subtree) for subtree in reversed(node.subtrees))
+
+    def biggest_movers(self, k: int, depth: Optional[int] = None,
+                       grew: Optional[bool] = None) -> list[tuple[list[Any], int, int, int]]:
+        """Return the (at most) k paths whose frequency changed the most, as (path, old, new, change), biggest first.
+
+        If grew is None, paths are ranked by the size of their change; if grew is True, only by their increase
+        and if False, only by their decrease, leaving out paths that changed the other way. If depth is given,
+        only paths to nodes at that depth are considered. Ties keep the preorder of the paths.
+
+        Preconditions:
+            - k >= 0
+            - depth is None or depth >= 1
+        """
+        if grew is None:
+            candidates = ((abs(node.change), path, node) for path, node in self.paths(depth) if node.change != 0)
+        elif grew:
+            candidates = ((node.change, path, node) for path, node in self.paths(depth) if node.change > 0)
+        else:
+            candidates = ((-node.change, path, node) for path, node in self.paths(depth) if node.change < 0)
+        top = heapq.nlargest(k, enumerate(candidates), key=lambda item: (item[1][0], -item[0]))
+        return [(path, node.old, node.new, node.change) for _, (_, path, node) in top]
+
+
+def diff_trees(old: Tree, new: Tree, root: Optional[Any] = None) -> DeltaTree:
+    """Return the delta tree of old and new, walking both in a single merged pass.
+
+    Subtrees keep the order of old, followed by the subtrees only in new in their order there. The root value
+    of the delta tree is root, or "<old root> to <new root>" if root is None.
+
+    Preconditions:
+        - old and new were built with the same hierarchy
+    """
+    delta = DeltaTree(f'{old.root} to {new.root}' if root is None else root, old.freq, new.freq, [])
+    stack = [(delta, old.subtrees, new.subtrees)]
+    while stack:
+        node, old_subtrees, new_subtrees = stack.pop()
+        new_by_root = {}
+        for subtree in new_subtrees:
+            new_by_root.setdefault(subtree.root, subtree)
+        for old_subtree in old_subtrees:
+            new_subtree = new_by_root.pop(old_subtree.root, None)
+            if new_subtree is None:
+                child = DeltaTree(old_subtree.root, old_subtree.freq, 0, [])
+                stack.append((child, old_subtree.subtrees, []))
+            else:
+                child = DeltaTree(old_subtree.root, old_subtree.freq, new_subtree.freq, [])
+                stack.append((child, old_subtree.subtrees, new_subtree.subtrees))
+            node.subtrees.append(child)
+        for new_subtree in new_by_root.values():
+            child = DeltaTree(new_subtree.root, 0, new_subtree.freq, [])
+            stack.append((child, [], new_subtree.subtrees))
+            node.subtrees.append(child)
+    return delta
+
+
+class SeriesTree:
+    """Every path of a series of trees of the same hierarchy, stored once with its frequency in each period.
+
+    Instance Attributes:
+    - root: value of node
+    - freqs: frequency of node in each period of the series (0 in the periods it does not occur in)
+    - subtrees: list of subtrees of the node, in order of first occurrence across the periods
+
+    Representation Invariants:
+    - all(freq >= 0 for freq in self.freqs)
+    - all(len(subtree.freqs) == len(self.freqs) for subtree in self.subtrees)
+
+    >>> trees = []
+    >>> for month, crimes in [("Jan", ["Theft", "Theft"]), ("Feb", ["Assault"]), ("Mar", ["Theft", "Assault"])]:
+    ...     tree = Tree(month, 0, [])
+    ...     for crime in crimes:
+    ...         tree.insert_data([crime], [0])
+    ...     trees.append(tree)
+    >>> series = SeriesTree.from_trees("Q1", trees)
+    >>> [(subtree.root, subtree.freqs) for subtree in series.subtrees]
+    [('Theft', [2, 0, 1]), ('Assault', [0, 1, 1])]
+    >>> print(series.delta(0, 2), end='')
+    Q1 (2 -> 2, +0)
+      Theft (2 -> 1, -1)
+      Assault (0 -> 1, +1)
+    """
+    root: Any
+    freqs: list[int]
+    subtrees: list[SeriesTree]
+
+    def __init__(self, root: Any, freqs: list[int], subtrees: list[SeriesTree]) -> None:
+        """Initialize a new series tree with the given root value, frequencies and subtrees."""
+        self.root = root
+        self.freqs = freqs
+        self.subtrees = subtrees
+
+    @classmethod
+    def from_trees(cls, root: Any, trees: list[Tree]) -> SeriesTree:
+        """Return the series tree of trees, one period per tree, merging all of them in a single pass.
+
+        Preconditions:
+            - len(trees) >= 1
+            - all trees were built with the same hierarchy
+        """
+        periods = len(trees)
+        series = cls(root, [tree.freq for tree in trees], [])
+        stack = [(series, [tree.subtrees for tree in trees])]
+        while stack:
+            node, subtrees_by_period = stack.pop()
+            # Map each root value to its series subtree and to the subtrees it merges from each period
+            merged = {}
+            for period, subtrees in enumerate(subtrees_by_period):
+                for subtree in subtrees:
+                    if subtree.root not in merged:
+                        merged[subtree.root] = (cls(subtree.root, [0] * periods, []), [[] for _ in range(periods)])
+                    child, child_subtrees = merged[subtree.root]
+                    child.freqs[period] += subtree.freq
+                    child_subtrees[period] = subtree.subtrees
+            for child, child_subtrees in merged.values():
+                node.subtrees.append(child)
+                stack.append((child, child_subtrees))
+        return series
+
+    def delta(self, old: int, new: int, root: Optional[Any] = None) -> DeltaTree:
+        """Return the delta tree from period old to period new, leaving out paths that occur in neither.
+
+        The root value of the delta tree is root, or the root value of this tree if root is None.
+
+        Preconditions:
+            - 0 <= old < len(self.freqs) and 0 <= new < len(self.freqs)
+        """
+        delta = DeltaTree(self.root if root is None else root, self.freqs[old], self.freqs[new], [])
+        stack = [(delta, self)]
+        while stack:
+            delta_node, node = stack.pop()
+            for subtree in node.subtrees:
+                if subtree.freqs[old] or subtree.freqs[new]:
+                    child = DeltaTree(subtree.root, subtree.freqs[old], subtree.freqs[new], [])
+                    delta_node.subtrees.append(child)
+                    stack.append((child, subtree))
+        return delta
+
+
+def month_series(columns: list[str], csv_path: str = CSV_PATH) -> SeriesTree:
+    """Return the series tree of the full trees of every month, January to December, for the given hierarchy.
+
+    Preconditions:
+        - len(columns) > 0
+        - the csv file at csv_path exists and format is valid
+    """
+    trees = [build_crime_tree(month, columns, csv_path)[0] for month in MONTHS]
+    return SeriesTree.from_trees('Crimes in Toronto by Month', trees)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()